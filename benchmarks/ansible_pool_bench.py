@@ -0,0 +1,101 @@
+""" Per-step overhead of ansible-playbook runs with and without the pre-warmed worker pool.
+
+Runs a two task playbook against localhost (ansible_connection=local), so the time is mostly
+interpreter start, ansible import, plugin load and inventory parse, the part the pool removes.
+
+    python benchmarks/ansible_pool_bench.py --runs 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from deploy_host.ansible_pool import AnsiblePool
+from deploy_host.ansible_profile import ConnectionProfile
+
+PLAYBOOK = ('---\n'
+            '- hosts: all\n'
+            '  gather_facts: no\n'
+            '  tasks:\n'
+            '  - name: debug\n'
+            '    debug:\n'
+            '      msg: step\n'
+            '  - name: command\n'
+            '    command: "true"\n')
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def run_steps(pool, playbook, inventory, runs, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def step():
+        async with limit:
+            started = time.perf_counter()
+            result = await pool.run(playbook, inventory, "localhost")
+            if not result.succeeded("localhost"):
+                raise SystemExit('\n'.join(result.output) or f'playbook failed with {result.returncode}')
+            timings.append((time.perf_counter() - started, result.timings["spawn"]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(step() for _ in range(runs)))
+    return timings, time.perf_counter() - started
+
+
+def report(name, timings, elapsed, cpu):
+    totals = [total for total, _ in timings]
+    spawns = [spawn for _, spawn in timings]
+    print(f'{name:10} step p50 {statistics.median(totals) * 1000:7.0f} ms  max {max(totals) * 1000:7.0f} ms  '
+          f'spawn p50 {statistics.median(spawns) * 1000:6.1f} ms  '
+          f'{len(timings) / elapsed:5.2f} steps/s  child cpu {cpu / len(timings) * 1000:6.0f} ms/step')
+
+
+async def run(args, workdir):
+    profile = ConnectionProfile(connection="local", control_path_dir=os.path.join(workdir, "cp"))
+    profile.write()
+    playbook = os.path.join(workdir, "playbook.yml")
+    inventory = os.path.join(workdir, "inventory")
+    with open(playbook, 'w') as file:
+        file.write(PLAYBOOK)
+    with open(inventory, 'w') as file:
+        file.write(f'localhost ansible_connection=local ansible_python_interpreter={sys.executable}')
+
+    subprocess_pool = AnsiblePool(profile, size=0)
+    cpu = children_cpu()
+    timings, elapsed = await run_steps(subprocess_pool, playbook, inventory, args.runs, args.concurrency)
+    report("subprocess", timings, elapsed, children_cpu() - cpu)
+
+    pool = AnsiblePool(profile, size=args.concurrency, max_jobs=args.max_jobs)
+    started = time.perf_counter()
+    await pool.start()
+    if pool.disabled:
+        raise SystemExit('ansible workers did not start')
+    print(f'pool of {args.concurrency} workers warm in {time.perf_counter() - started:.2f}s')
+    cpu = children_cpu()
+    timings, elapsed = await run_steps(pool, playbook, inventory, args.runs, args.concurrency)
+    await pool.stop()
+    # forked children are reaped by workers, their cpu is counted when the workers exit
+    report("pool", timings, elapsed, children_cpu() - cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--max-jobs', type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(run(args, workdir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+""" Offline stand-in of the [APT_CACHE] mode=repo package source: a flat repository of dummy packages,
+signed like a real one, served over http the way the deploy server serves repo_dir under /apt.
+
+    python benchmarks/apt_repo_standin.py --packages nginx rsync curl
+
+Builds the packages with dpkg-deb, indexes them with dpkg-scanpackages, writes Release and signs it to
+InRelease with a throwaway gpg key. A host is played by apt-get with its own state directories: it reads
+the source line rendered by apt_cache.yml.j2, runs update and downloads every package, so the
+signature check of signed-by runs as on a real host. A tampered Packages index has to be refused.
+Prints AptCache hit/miss counts of the install list. Needs dpkg-deb, dpkg-scanpackages, gpg and apt-get.
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from deploy_host.aptcache import AptCache
+
+CONTROL = ('Package: {name}\n'
+           'Version: 1.0\n'
+           'Architecture: all\n'
+           'Maintainer: deploy <deploy@localhost>\n'
+           'Description: stand-in of {name}\n')
+
+
+def run(*args, **kwargs):
+    return subprocess.run(args, check=True, capture_output=True, text=True, **kwargs).stdout
+
+
+def build_packages(repo, names):
+    for name in names:
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "DEBIAN"))
+            with open(os.path.join(root, "DEBIAN", "control"), 'w') as file:
+                file.write(CONTROL.format(name=name))
+            run("dpkg-deb", "--build", "--root-owner-group", root, os.path.join(repo, f'{name}_1.0_all.deb'))
+    with open(os.path.join(repo, "Packages"), 'w') as file:
+        file.write(run("dpkg-scanpackages", "--multiversion", ".", "/dev/null", cwd=repo))
+
+
+def write_release(repo):
+    """ Release with hashes of index, what apt-ftparchive release writes for a flat repository """
+    lines = ['Origin: deploy', 'Label: deploy', 'SHA256:']
+    with open(os.path.join(repo, "Packages"), 'rb') as file:
+        content = file.read()
+    lines.append(f' {hashlib.sha256(content).hexdigest()} {len(content)} Packages')
+    with open(os.path.join(repo, "Release"), 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def sign(repo, gnupghome):
+    """ InRelease signed by new key, returns armored public key for repo_key """
+    gpg = ("gpg", "--batch", "--homedir", gnupghome)
+    run(*gpg, "--passphrase", "", "--quick-gen-key", "deploy-standin <deploy@localhost>", "default", "sign", "never")
+    run(*gpg, "--yes", "--clearsign", "-o", os.path.join(repo, "InRelease"), os.path.join(repo, "Release"))
+    key = os.path.join(gnupghome, "deploy-local.asc")
+    with open(key, 'w') as file:
+        file.write(run(*gpg, "--armor", "--export"))
+    return key
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(repo):
+    handler = functools.partial(QuietHandler, directory=repo)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def host_apt(host, url, key):
+    """ apt-get of simulated host with source line of apt_cache.yml.j2 """
+    for directory in ("state/lists/partial", "cache/archives/partial", "parts", "prefs"):
+        os.makedirs(os.path.join(host, directory), exist_ok=True)
+    with open(os.path.join(host, "sources.list"), 'w') as file:
+        file.write(f'deb [signed-by={key}] {url} ./\n')
+    options = {"Dir::State": os.path.join(host, "state"), "Dir::State::status": "/dev/null",
+               "Dir::Cache": os.path.join(host, "cache"), "Dir::Etc::sourcelist": os.path.join(host, "sources.list"),
+               "Dir::Etc::sourceparts": os.path.join(host, "parts"),
+               "Dir::Etc::preferencesparts": os.path.join(host, "prefs"), "APT::Sandbox::User": "root",
+               "Debug::NoLocking": "true"}
+    return ["apt-get", "-q"] + [f'-o{name}={value}' for name, value in options.items()]
+
+
+def check(repo, url, key, names):
+    with tempfile.TemporaryDirectory() as host:
+        apt = host_apt(host, url, key)
+        run(*apt, "update")
+        for name in names:
+            run(*apt, "download", name, cwd=host)
+        downloaded = sorted(entry for entry in os.listdir(host) if entry.endswith('.deb'))
+        print(f'signed repository: update ok, downloaded {" ".join(downloaded)}')
+    with open(os.path.join(repo, "Packages"), 'a') as file:
+        file.write('\n')
+    with tempfile.TemporaryDirectory() as host:
+        result = subprocess.run([*host_apt(host, url, key), "update"], capture_output=True, text=True)
+        refused = result.returncode != 0 or "Hash Sum mismatch" in result.stdout + result.stderr \
+            or "File has unexpected size" in result.stdout + result.stderr
+        print(f'tampered Packages: {"refused" if refused else "ACCEPTED"}')
+        if not refused:
+            raise SystemExit('apt accepted repository which does not match signed Release')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--packages', nargs='+', default=["nginx", "rsync", "curl"])
+    parser.add_argument('--install-list', nargs='+', default=["nginx", "rsync", "curl", "mc"])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as repo, tempfile.TemporaryDirectory() as gnupghome:
+        build_packages(repo, args.packages)
+        write_release(repo)
+        key = sign(repo, gnupghome)
+        server = serve(repo)
+        try:
+            url = f'http://127.0.0.1:{server.server_address[1]}'
+            cache = AptCache(mode="repo", repo_dir=repo, repo_url=url, repo_key=key)
+            cached = asyncio.run(cache.snapshot())
+            check(repo, url, key, args.packages)
+            sources = cache.sources(args.install_list, cached, asyncio.run(cache.snapshot()))
+            print(' '.join(f'{source} {len(names)} {names}' for source, names in sources.items()))
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
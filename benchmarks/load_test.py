@@ -0,0 +1,209 @@
+""" Load test of /ws/{client_id} without network or hosts: the app runs in this process and is driven
+over ASGI, ansible-playbook is benchmarks/fake_ansible, ssh is the in-process stand-in.
+
+    python benchmarks/load_test.py --sessions 20 --task-seconds 0.05
+
+Every session sends check_password, then deploy_server, and waits until its job is done.
+Prints throughput, latency percentiles per step, event loop lag and memory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+from ssh_standin import SSHStandin
+
+SETTINGS = '''[Config]
+path_hotbackup_key={workdir}/id_rsa.pub
+backup_client_files={workdir}/backup
+[GIT]
+git_login=
+git_password=
+cache_dir={workdir}/git_cache
+[LOG]
+logpath={workdir}/load.log
+[SERVER_IP]
+ip=10.255.255.254
+[INSTALL]
+batch_install=yes
+update_cache=no
+[DEPLOY]
+site_playbook={site_playbook}
+max_parallel_steps=3
+workdir_base={workdir}
+[SSH]
+max_connections={sessions}
+[ANSIBLE]
+connection=paramiko
+control_path_dir={workdir}/cp
+pool_size=0
+[STATE]
+path={workdir}/state
+[JOBS]
+path={workdir}/jobs.sqlite
+workers={sessions}
+'''
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class ASGIWebSocket:
+    """ websocket client talking to ASGI app directly """
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        scope = {"type": "websocket", "asgi": {"version": "3.0"}, "path": self.path, "raw_path": self.path.encode(),
+                 "root_path": "", "scheme": "ws", "query_string": b"", "headers": [], "subprotocols": [],
+                 "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 5000)}
+        self.task = asyncio.create_task(self.app(scope, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({"type": "websocket.connect"})
+        message = await self.outgoing.get()
+        assert message["type"] == "websocket.accept", message
+
+    async def send_json(self, data):
+        await self.incoming.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self):
+        message = await self.outgoing.get()
+        if message["type"] != "websocket.send":
+            raise ConnectionError(message)
+        return json.loads(message["text"])
+
+    async def close(self):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+class Lifespan:
+    """ startup and shutdown events of ASGI app """
+
+    def __init__(self, app):
+        self.app = app
+        self.messages = asyncio.Queue()
+        self.replies = asyncio.Queue()
+        self.task = None
+
+    async def send(self, event):
+        if self.task is None:
+            self.task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}},
+                                                     self.messages.get, self.replies.put))
+        await self.messages.put({"type": f'lifespan.{event}'})
+        reply = await self.replies.get()
+        assert reply["type"] == f'lifespan.{event}.complete', reply
+
+
+async def loop_lag(samples, interval=0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def session(app, number, host, port, install_list, steps):
+    host_data = {"client_login": "deploy", "client_ip": host, "client_port": str(port), "client_password": "deploy",
+                 "client_sudo_password": "deploy", "hostname": f'load-{number}', "hotel_id": f'load{number}',
+                 "uplink_interface": "eth0"}
+    websocket = ASGIWebSocket(app, f'/ws/load{number}')
+    await websocket.connect()
+    messages = 0
+    started = time.perf_counter()
+    await websocket.send_json({"task": "check_password", "host_data": host_data})
+    while True:
+        message = await websocket.receive_json()
+        messages += 1
+        if message["task"] in ("check_password", "Alert"):
+            break
+    steps.setdefault("check_password", []).append(time.perf_counter() - started)
+    await websocket.send_json({"task": "deploy_server", "host_data": host_data, "dhcp": {"dhcp_status": False},
+                               "install_list": install_list, "git": [], "git_login": "", "password_status": True,
+                               "force": True})
+    first_seen = {}
+    while True:
+        message = await websocket.receive_json()
+        messages += 1
+        now = time.perf_counter()
+        task = message.get("task")
+        if message.get("status") == "processing":
+            first_seen.setdefault(task, now)
+        elif task in first_seen and message.get("status") in ("completed", "broked"):
+            steps.setdefault(task, []).append(now - first_seen.pop(task))
+        if task == "job" and message.get("job_status") in ("done", "failed"):
+            break
+    steps.setdefault("session", []).append(time.perf_counter() - started)
+    await websocket.close()
+    return messages
+
+
+async def run(args):
+    # main imports websoket_validate which imports main, so it is imported first like `python main.py` does
+    import websoket_validate
+    import main
+    lifespan = Lifespan(main.app)
+    await lifespan.send("startup")
+    samples = []
+    lag = asyncio.create_task(loop_lag(samples))
+    standin = SSHStandin(hosts=args.sessions, latency=args.ssh_latency).start()
+    steps = {}
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    messages = await asyncio.gather(*(session(main.app, number, host, standin.port, args.install_list, steps)
+                                      for number, host in enumerate(standin.addresses)))
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    lag.cancel()
+    standin.stop()
+    await lifespan.send("shutdown")
+
+    print(f'sessions {args.sessions}  time {elapsed:.2f}s  {args.sessions / elapsed:.2f} deploys/s  '
+          f'{sum(messages) / elapsed:.0f} messages/s  ssh commands {standin.commands}')
+    print(f'{"step":16} {"count":>6} {"p50 ms":>9} {"p95 ms":>9} {"max ms":>9}')
+    for step, values in sorted(steps.items()):
+        print(f'{step:16} {len(values):6} {statistics.median(values) * 1000:9.1f} '
+              f'{percentile(values, 0.95) * 1000:9.1f} {max(values) * 1000:9.1f}')
+    print(f'event loop lag  p50 {statistics.median(samples) * 1000:.1f} ms  p99 {percentile(samples, 0.99) * 1000:.1f} ms'
+          f'  max {max(samples) * 1000:.1f} ms')
+    print(f'max rss {rss_before / 1024:.0f} MB before sessions, {rss_after / 1024:.0f} MB after')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--install-list', default="nginx rsync curl")
+    parser.add_argument('--site-playbook', action='store_true')
+    parser.add_argument('--task-seconds', type=float, default=0.05, help="fake ansible time per task")
+    parser.add_argument('--startup-seconds', type=float, default=0.3, help="fake ansible start time")
+    parser.add_argument('--ssh-latency', type=float, default=0.01)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+    os.environ["PATH"] = os.path.join(BENCH_DIR, "fake_ansible") + os.pathsep + os.environ["PATH"]
+    os.environ["FAKE_ANSIBLE_TASK"] = str(args.task_seconds)
+    os.environ["FAKE_ANSIBLE_STARTUP"] = str(args.startup_seconds)
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "deploy_settings.ini"), 'w') as file:
+            file.write(SETTINGS.format(workdir=workdir, sessions=args.sessions,
+                                       site_playbook="yes" if args.site_playbook else "no"))
+        os.chdir(workdir)
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Lines per second of the old `echo >> logpath` subprocess logging against LogSink.
+
+    python benchmarks/log_bench.py --lines 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from deploy_host.logsink import LogSink
+
+
+async def echo_subprocess(path, lines):
+    processes = []
+    for number in range(lines):
+        processes.append(await asyncio.create_subprocess_shell(
+            f'echo `date` - HotelID:77 task{number} completed >> {path}'))
+    # old code never waited for them, wait here so the timing counts the real work
+    for process in processes:
+        await process.wait()
+
+
+async def log_sink(path, lines):
+    sink = LogSink(path)
+    for number in range(lines):
+        sink.write(f'task{number} completed', hotel_id="77", client_ip="10.0.0.5", task=f'task{number}',
+                   result='completed', duration=1.5)
+    await sink.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=2000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, writer in (("echo subprocess", echo_subprocess), ("LogSink", log_sink)):
+            path = os.path.join(workdir, name.replace(' ', '_'))
+            started = time.monotonic()
+            await writer(path, args.lines)
+            elapsed = time.monotonic() - started
+            with open(path) as file:
+                written = sum(1 for _ in file)
+            print(f'{name:16} {args.lines / elapsed:12.0f} lines/sec  written={written}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
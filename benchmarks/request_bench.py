@@ -0,0 +1,139 @@
+""" Validation and render cost of one deploy_server message: validators of every check function
+(as websoket_validate had them) with raw dict rendering, against one DeployRequest.
+
+    python benchmarks/request_bench.py --requests 2000
+"""
+import argparse
+import ipaddress
+import os
+import sys
+import time
+import warnings
+
+from pydantic import BaseModel, validator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from deploy_host.models import DeployRequest
+from deploy_host.playbooks import PlaybookTemplates
+
+warnings.simplefilter("ignore")
+
+HOST = {"client_login": "admin", "client_ip": "10.0.0.5", "client_port": "22", "client_password": "secret",
+        "client_sudo_password": "secret", "hostname": "hotel-77", "hotel_id": "77", "uplink_interface": "eth0"}
+DHCP = {"dhcp_status": True, "dhcp_network": "10.1.0.0", "dhcp_mask": "255.255.255.0",
+        "dhcp_range_start": "10.1.0.10", "dhcp_range_end": "10.1.0.200", "dhcp_dns": "10.1.0.1",
+        "domain_name": "hotel.local", "dhcp_gateway": "10.1.0.1", "dhcp_broadcast": "10.1.0.255",
+        "dhcp_interface": "eth1"}
+MESSAGE = {"task": "deploy_server", "host_data": HOST, "dhcp": DHCP, "install_list": "nginx rsync curl mc",
+           "git": ["tv", "pms"], "git_login": "hotel", "password_status": True}
+SERVER_IP = (ipaddress.ip_address("127.0.0.1"), ipaddress.ip_address("10.180.180.4"))
+CONTEXT = {"dhcp_config": "/dev/shm/dhcpd.conf", "nginx_config": "/dev/shm/nginx_site.conf", "package": "nginx",
+           "packages": ["nginx", "rsync"], "names": ["nginx", "rsync"], "update_cache": True, "mode": "proxy",
+           "proxy_url": "http://10.180.180.4:3142", "repo_url": "", "branch": "develop", "sha": "0" * 40,
+           "bundle": "/tmp/tv.bundle", "pubkey": "id_rsa.pub", "backupfiles": "backup", "cloud_cfg": True}
+
+
+def not_empty(cls, v):
+    if v == '' or v is None:
+        raise ValueError("field cannot be empty")
+    return v
+
+
+class CheckPasswordValidator(BaseModel):
+    login: str
+    ip_address: ipaddress.IPv4Address
+    port: int
+    password: str
+    sudo_password: str
+
+    _login = validator('login', 'password', 'sudo_password', allow_reuse=True)(not_empty)
+
+
+class InstallDataValidator(CheckPasswordValidator):
+    hostname: str
+    hotel_id: str
+    uplink_interface: str
+
+    _hostname = validator('hostname', 'hotel_id', 'uplink_interface', allow_reuse=True)(not_empty)
+
+
+class DhcpDataValidator(BaseModel):
+    dhcp_network: ipaddress.IPv4Address
+    dhcp_mask: ipaddress.IPv4Address
+    dhcp_range_start: ipaddress.IPv4Address
+    dhcp_range_end: ipaddress.IPv4Address
+    dhcp_dns: ipaddress.IPv4Address
+    domain_name: str
+    dhcp_gateway: ipaddress.IPv4Address
+    dhcp_broadcast: ipaddress.IPv4Address
+    dhcp_eth: str
+
+    _domain = validator('domain_name', 'dhcp_eth', allow_reuse=True)(not_empty)
+
+
+class ServerIpValidator(BaseModel):
+    ip_server: ipaddress.IPv4Address
+
+    @validator('ip_server')
+    def check_server_ip(cls, v):
+        if v in SERVER_IP:
+            raise ValueError('server ip')
+        return v
+
+
+def dict_checks(data):
+    host, dhcp = data["host_data"], data["dhcp"]
+    ServerIpValidator(ip_server=host["client_ip"].strip())
+    InstallDataValidator(login=host["client_login"].strip(), ip_address=host["client_ip"].strip(),
+                         port=host["client_port"].strip(), password=host["client_password"].strip(),
+                         sudo_password=host["client_sudo_password"].strip(), hostname=host["hostname"].strip(),
+                         hotel_id=host["hotel_id"].strip(), uplink_interface=host["uplink_interface"].strip())
+    if dhcp["dhcp_status"] == True:
+        DhcpDataValidator(dhcp_network=dhcp["dhcp_network"].strip(), dhcp_mask=dhcp["dhcp_mask"].strip(),
+                          dhcp_range_start=dhcp["dhcp_range_start"].strip(),
+                          dhcp_range_end=dhcp["dhcp_range_end"].strip(), dhcp_dns=dhcp["dhcp_dns"].strip(),
+                          domain_name=dhcp["domain_name"].strip(), dhcp_gateway=dhcp["dhcp_gateway"].strip(),
+                          dhcp_broadcast=dhcp["dhcp_broadcast"].strip(), dhcp_eth=dhcp["dhcp_interface"].strip())
+    return data
+
+
+def model_checks(data):
+    request = DeployRequest.model_validate(data)
+    ipaddress.ip_address(request.host_data.client_ip) in SERVER_IP
+    return request
+
+
+def render_all(templates, data):
+    if isinstance(data, dict):
+        host, dhcp = data["host_data"], data["dhcp"]
+    else:
+        host, dhcp = data.host_data, data.dhcp
+    for template in templates.templates.values():
+        template.render(data=data, host=host, dhcp=dhcp, **CONTEXT)
+
+
+def measure(name, check, templates, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        check(MESSAGE)
+    validate = (time.perf_counter() - started) / requests
+    data = check(MESSAGE)
+    started = time.perf_counter()
+    for _ in range(requests):
+        render_all(templates, data)
+    render = (time.perf_counter() - started) / requests
+    print(f'{name:14} validate {validate * 1e6:8.1f} us  render {render * 1e6:8.1f} us  '
+          f'total {(validate + render) * 1e6:8.1f} us/request')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    templates = PlaybookTemplates()
+    measure("dict checks", dict_checks, templates, args.requests)
+    measure("DeployRequest", model_checks, templates, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+""" In-process ssh server for check_password and preflight probe, one listener per loopback address
+so every simulated host has own ip.
+
+    server = SSHStandin(hosts=10, latency=0.02)
+    server.start()   # hosts 127.0.0.2 .. 127.0.0.11, port server.port, any login/password
+"""
+import socket
+import threading
+import time
+
+import paramiko
+
+FACTS = ('sudo=1\n'
+         'interfaces=eth0 eth1 lo\n'
+         'os=ubuntu 22.04\n'
+         'disk_free_kb=20971520\n'
+         'python=/usr/bin/python3\n'
+         'apt_locked=no\n'
+         'cloud_cfg=yes\n')
+
+
+class StandinServer(paramiko.ServerInterface):
+
+    def __init__(self):
+        self.commands = {}
+        self.exec_requested = threading.Condition()
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        with self.exec_requested:
+            self.commands[channel.get_id()] = command.decode("utf-8")
+            self.exec_requested.notify_all()
+        return True
+
+    def command(self, channel, timeout=5):
+        with self.exec_requested:
+            self.exec_requested.wait_for(lambda: channel.get_id() in self.commands, timeout)
+            return self.commands.pop(channel.get_id(), "")
+
+
+class SSHStandin:
+    """ answers preflight probe with fixed facts and `sudo -l` with full rights after latency seconds """
+
+    def __init__(self, hosts=1, latency=0.0, first_host=2):
+        self.addresses = [f'127.0.0.{first_host + number}' for number in range(hosts)]
+        self.latency = latency
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sockets = []
+        self.port = None
+        self.running = False
+        self.commands = 0
+
+    def start(self):
+        self.running = True
+        for address in self.addresses:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((address, self.port or 0))
+            self.port = listener.getsockname()[1]
+            listener.listen(100)
+            listener.settimeout(0.5)
+            self.sockets.append(listener)
+            threading.Thread(target=self.accept, args=(listener,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        for listener in self.sockets:
+            listener.close()
+
+    def accept(self, listener):
+        while self.running:
+            try:
+                client, _ = listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(client,), daemon=True).start()
+
+    def serve(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        server = StandinServer()
+        try:
+            transport.start_server(server=server)
+            while self.running and transport.is_active():
+                channel = transport.accept(1)
+                if channel is None:
+                    continue
+                threading.Thread(target=self.execute, args=(channel, server), daemon=True).start()
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+        finally:
+            transport.close()
+
+    def execute(self, channel, server):
+        command = server.command(channel)
+        self.commands += 1
+        if "read -r pw" in command or "sudo -S" in command or command.startswith("sudo"):
+            # password line from stdin
+            data = b''
+            while not data.endswith(b'\n') and not channel.closed:
+                chunk = channel.recv(1024)
+                if not chunk:
+                    break
+                data += chunk
+        time.sleep(self.latency)
+        if "read -r pw" in command:
+            output = FACTS
+        elif command.startswith("sudo -l"):
+            output = "User may run the following commands:\n    (ALL : ALL) ALL\n"
+        elif "/sys/class/net" in command:
+            output = "eth0 eth1 lo\n"
+        else:
+            output = ""
+        channel.sendall(output.replace('\n', '\r\n').encode("utf-8"))
+        channel.send_exit_status(0)
+        channel.close()
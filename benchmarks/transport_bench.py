@@ -0,0 +1,72 @@
+""" Compare ansible transports on consecutive playbook runs against one host.
+
+Local sshd container for the test:
+    docker run -d --name deploy-sshd -p 2222:2222 -e PASSWORD_ACCESS=true \
+        -e USER_NAME=deploy -e USER_PASSWORD=deploy -e SUDO_ACCESS=true linuxserver/openssh-server
+    python benchmarks/transport_bench.py --ip 127.0.0.1 --port 2222 --login deploy --password deploy
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from deploy_host.ansible_profile import ConnectionProfile
+
+PLAYBOOK = ('---\n'
+            '- hosts: all\n'
+            '  gather_facts: no\n'
+            '  tasks:\n'
+            '  - name: command\n'
+            '    command: uname -a\n'
+            '  - name: file\n'
+            '    stat:\n'
+            '      path: /etc/hostname\n')
+
+
+def run_profile(profile, args, workdir):
+    profile.write()
+    inventory = os.path.join(workdir, f'{profile.connection}_inventory')
+    playbook = os.path.join(workdir, 'playbook.yml')
+    with open(inventory, 'w') as file:
+        file.write(f'{args.ip} ansible_user={args.login} ansible_host={args.ip} ansible_port={args.port}'
+                   f' ansible_password={args.password} ansible_become_pass={args.password}'
+                   f'{profile.inventory_vars()}')
+    with open(playbook, 'w') as file:
+        file.write(PLAYBOOK)
+    timings = []
+    for _ in range(args.runs):
+        start = time.monotonic()
+        result = subprocess.run(["ansible-playbook", *profile.args(playbook, inventory, args.ip)],
+                                env=profile.environment(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        timings.append(time.monotonic() - start)
+        if result.returncode != 0:
+            print(result.stdout.decode("utf-8"))
+            raise SystemExit(f'{profile.connection}: ansible-playbook failed')
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ip', required=True)
+    parser.add_argument('--port', default='22')
+    parser.add_argument('--login', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        profiles = [ConnectionProfile("paramiko", False, os.path.join(workdir, "paramiko")),
+                    ConnectionProfile("ssh", True, os.path.join(workdir, "ssh"))]
+        for profile in profiles:
+            timings = run_profile(profile, args, workdir)
+            print(f'{profile.connection:9} pipelining={profile.pipelining!s:5} '
+                  f'first={timings[0]:.2f}s median={statistics.median(timings):.2f}s '
+                  f'total={sum(timings):.2f}s runs={len(timings)}')
+
+
+if __name__ == '__main__':
+    main()
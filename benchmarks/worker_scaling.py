@@ -0,0 +1,165 @@
+""" Deploy job throughput of uvicorn with several worker processes which share jobs and events through
+the sqlite backend. ansible-playbook is benchmarks/fake_ansible, ssh is the stand-in of this process.
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 --sessions 20 --task-seconds 0.05
+
+Every session connects over a real websocket, sends deploy_server and waits until its job is done. The
+job is claimed by any worker, so its events reach the session through the shared database when the
+session is connected to another process. Prints deploys/s, session latency, how jobs spread over the
+workers and which part of the stored job events sessions received: every result has to arrive, progress
+messages of a task replace each other in the websocket queue, so fewer of them arrive when events of
+another process come in batches of one poll. Needs the websockets package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from load_test import SETTINGS, percentile
+from ssh_standin import SSHStandin
+
+PROGRESS = ("processing", "queued")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with websockets.connect(f'ws://127.0.0.1:{port}/ws/ready'):
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise SystemExit(f'server on port {port} did not start in {timeout}s')
+
+
+async def session(port, number, host, ssh_port, install_list):
+    """ seconds from deploy_server to job done, job id, job status and received messages, all of them are of the job """
+    host_data = {"client_login": "deploy", "client_ip": host, "client_port": str(ssh_port),
+                 "client_password": "deploy", "client_sudo_password": "deploy", "hostname": f'scale-{number}',
+                 "hotel_id": f'scale{number}', "uplink_interface": "eth0"}
+    async with websockets.connect(f'ws://127.0.0.1:{port}/ws/scale{number}', max_queue=None,
+                                  ping_interval=None) as websocket:
+        started = time.perf_counter()
+        await websocket.send(json.dumps({"task": "deploy_server", "host_data": host_data,
+                                         "dhcp": {"dhcp_status": False}, "install_list": install_list, "git": [],
+                                         "git_login": "", "password_status": True, "force": True}))
+        job_id = None
+        received = []
+        while True:
+            message = json.loads(await websocket.recv())
+            received.append(message)
+            if message.get("task") == "job":
+                job_id = job_id or message["job_id"]
+            if message.get("task") == "job" and message.get("job_status") in ("done", "failed", "cancelled"):
+                return time.perf_counter() - started, job_id, message["job_status"], received
+
+
+def delivered(messages, stored):
+    """ fractions of stored results and progress messages found in received ones """
+    counts = {}
+    for name, source in (("received", messages), ("stored", stored)):
+        for message in source:
+            kind = "progress" if message.get("status") in PROGRESS else "results"
+            counts[kind, name] = counts.get((kind, name), 0) + 1
+    return {kind: counts.get((kind, "received"), 0) / max(1, counts.get((kind, "stored"), 0))
+            for kind in ("results", "progress")}
+
+
+def job_stats(path, job_ids):
+    """ owner process of every job and events stored for it """
+    connection = sqlite3.connect(path)
+    try:
+        owners = dict(connection.execute(
+            f'SELECT id, owner FROM jobs WHERE id IN ({",".join("?" * len(job_ids))})', job_ids))
+        stored = {}
+        for job_id, message in connection.execute(
+                f'SELECT job_id, message FROM events WHERE job_id IN ({",".join("?" * len(job_ids))})'
+                ' ORDER BY seq', job_ids):
+            stored.setdefault(job_id, []).append(json.loads(message))
+    finally:
+        connection.close()
+    return owners, stored
+
+
+def run_server(workdir, workers, port, env):
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                            cwd=workdir, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+
+
+async def drive(port, standin, args):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(session(port, number, host, standin.port, args.install_list)
+                                     for number, host in enumerate(standin.addresses)))
+    return results, time.perf_counter() - started
+
+
+def measure(args, workers, standin, env):
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "deploy_settings.ini"), 'w') as file:
+            file.write(SETTINGS.format(workdir=workdir, sessions=args.sessions, site_playbook="no"))
+            file.write(f'[BACKEND]\ntype=sqlite\nworkers={workers}\npoll_interval={args.poll_interval}\n')
+        port = free_port()
+        server = run_server(workdir, workers, port, env)
+        try:
+            asyncio.run(wait_ready(port, args.start_timeout))
+            results, elapsed = asyncio.run(drive(port, standin, args))
+        finally:
+            server.terminate()
+            server.wait()
+        owners, stored = job_stats(os.path.join(workdir, "jobs.sqlite"), [job_id for _, job_id, _, _ in results])
+    latencies = [latency for latency, _, _, _ in results]
+    failed = sum(status != "done" for _, _, status, _ in results)
+    fractions = delivered([message for *_, received in results for message in received],
+                          [message for messages in stored.values() for message in messages])
+    spread = sorted((list(owners.values()).count(owner) for owner in set(owners.values())), reverse=True)
+    print(f'workers {workers:2}  {args.sessions / elapsed:6.2f} deploys/s  session p50 '
+          f'{statistics.median(latencies):6.2f}s  p95 {percentile(latencies, 0.95):6.2f}s  '
+          f'jobs per worker {spread}  delivered results {fractions["results"]:6.1%} '
+          f'progress {fractions["progress"]:6.1%}  failed {failed}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--install-list', default="nginx rsync curl")
+    parser.add_argument('--task-seconds', type=float, default=0.05, help="fake ansible time per task")
+    parser.add_argument('--startup-seconds', type=float, default=0.3, help="fake ansible start time")
+    parser.add_argument('--ssh-latency', type=float, default=0.01)
+    parser.add_argument('--poll-interval', type=float, default=0.2)
+    parser.add_argument('--start-timeout', type=float, default=60)
+    args = parser.parse_args()
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               PATH=os.path.join(BENCH_DIR, "fake_ansible") + os.pathsep + os.environ["PATH"],
+               FAKE_ANSIBLE_TASK=str(args.task_seconds), FAKE_ANSIBLE_STARTUP=str(args.startup_seconds),
+               PYTHONWARNINGS="ignore")
+    standin = SSHStandin(hosts=args.sessions, latency=args.ssh_latency).start()
+    print(f'cpus {os.cpu_count()}, {args.sessions} sessions, install_list "{args.install_list}"')
+    try:
+        for workers in args.workers:
+            measure(args, workers, standin, env)
+    finally:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
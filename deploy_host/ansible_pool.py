@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from deploy_host.metrics import ansible_running, ansible_total, ansible_worker_starts
+from deploy_host.runner import PlaybookResult, read_events, stream_playbook
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ansible_worker.py")
+
+
+class AnsibleWorker:
+    """ one ansible_worker process, runs one playbook at a time """
+
+    def __init__(self, process):
+        self.process = process
+        self.jobs = 0
+        self.child = None
+        self.used = time.monotonic()
+
+    @property
+    def alive(self):
+        return self.process.returncode is None
+
+    def send(self, job):
+        self.process.stdin.write(json.dumps(job).encode("utf-8") + b'\n')
+
+    async def expect(self, state, timeout, on_output=None):
+        """ skip output until worker line of state, output before ready is import warnings of ansible """
+        while True:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+            if not line:
+                raise ConnectionError(f'ansible worker exited with {await self.process.wait()}')
+            try:
+                event = json.loads(line)
+            except ValueError:
+                if on_output is not None:
+                    on_output(line.decode("utf-8", "replace").rstrip())
+                continue
+            if isinstance(event, dict) and event.get("event") == "worker" and event.get("state") == state:
+                return event
+
+    def kill(self):
+        """ kill worker and process group of its running playbook """
+        try:
+            if self.child is not None:
+                os.killpg(self.child, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        if self.alive:
+            self.process.kill()
+
+
+class AnsiblePool:
+    """ bounded set of processes which imported ansible once, every playbook runs in a fork of warm worker.
+    Worker is replaced after max_jobs runs, after a broken run and when it does not answer ping after being
+    idle for ping_interval. With size 0 or when worker does not start ansible-playbook runs as before """
+
+    def __init__(self, profile, size=4, max_jobs=50, ping_interval=60, start_timeout=60, log=None):
+        self.profile = profile
+        self.log = log
+        self.size = size
+        self.max_jobs = max_jobs
+        self.ping_interval = ping_interval
+        self.start_timeout = start_timeout
+        self.idle = deque()
+        self.workers = set()
+        self.slots = None
+        self.disabled = size <= 0
+
+    @classmethod
+    def from_config(cls, profile, config_settings, log=None):
+        return cls(profile, size=config_settings.getint("ANSIBLE", "pool_size", fallback=4),
+                   max_jobs=config_settings.getint("ANSIBLE", "pool_max_jobs", fallback=50),
+                   ping_interval=config_settings.getint("ANSIBLE", "pool_ping_interval", fallback=60), log=log)
+
+    def write_log(self, message, result=None):
+        if self.log is not None:
+            self.log.write(message, task="ansible_pool", result=result)
+
+    async def start(self):
+        """ warm every worker before first deploy """
+        if self.disabled:
+            return
+        try:
+            self.idle.extend(await asyncio.gather(*(self.spawn("start") for _ in range(self.size))))
+        except (OSError, ConnectionError, asyncio.TimeoutError) as error:
+            self.write_log(f'ansible worker pool disabled: {error!r}', 'error')
+            self.disabled = True
+            await self.stop()
+
+    async def spawn(self, reason):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=self.profile.environment(),
+            limit=1024 * 1024)
+        worker = AnsibleWorker(process)
+        self.workers.add(worker)
+        try:
+            await worker.expect("ready", self.start_timeout, self.write_log)
+        except BaseException:
+            await self.retire(worker)
+            raise
+        ansible_worker_starts.inc(reason=reason)
+        return worker
+
+    async def retire(self, worker):
+        self.workers.discard(worker)
+        worker.kill()
+        await worker.process.wait()
+
+    async def healthy(self, worker):
+        if not worker.alive:
+            return False
+        if time.monotonic() - worker.used < self.ping_interval:
+            return True
+        try:
+            worker.send({"ping": True})
+            await worker.expect("pong", 5)
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def acquire(self):
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.size)
+        await self.slots.acquire()
+        reason = "demand"
+        try:
+            while self.idle:
+                worker = self.idle.pop()
+                if await self.healthy(worker):
+                    return worker
+                await self.retire(worker)
+                reason = "unhealthy"
+            return await self.spawn(reason)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, worker, reusable):
+        worker.used = time.monotonic()
+        if reusable and worker.alive and worker.jobs < self.max_jobs:
+            worker.child = None
+            self.idle.append(worker)
+        else:
+            # replaced in background so that next step does not wait for ansible import
+            asyncio.get_running_loop().create_task(self.replace(worker))
+        self.slots.release()
+
+    async def replace(self, worker):
+        await self.retire(worker)
+        try:
+            worker = await self.spawn("recycle")
+        except (OSError, ConnectionError, asyncio.TimeoutError) as error:
+            self.write_log(f'ansible worker not started: {error!r}', 'error')
+            return
+        if self.disabled:
+            # pool stopped while worker was starting
+            await self.retire(worker)
+        else:
+            self.idle.append(worker)
+
+    async def run(self, playbook, inventory, limit, on_event=None, tail=200, on_output=None):
+        """ run playbook in idle worker like runner.stream_playbook runs ansible-playbook """
+        if self.disabled:
+            return await stream_playbook(self.profile.args(playbook, inventory, limit), self.profile.environment(),
+                                         on_event, tail, on_output)
+        result = PlaybookResult(tail)
+        started = time.perf_counter()
+        worker = await self.acquire()
+        reusable = False
+        ansible_running.inc()
+        try:
+            worker.send({"args": self.profile.args(playbook, inventory, limit)})
+            worker.jobs += 1
+            worker.child = (await worker.expect("started", self.start_timeout, on_output))["pid"]
+            spawned = time.perf_counter()
+            result.timings["spawn"] = spawned - started
+            end = await read_events(worker.process.stdout, result, on_event, on_output)
+            if end is not None and end.get("state") == "exit":
+                result.returncode = end["returncode"]
+                reusable = True
+            else:
+                result.returncode = -1
+            result.timings["execute"] = time.perf_counter() - spawned
+        finally:
+            ansible_running.dec()
+            ansible_total.inc(returncode=result.returncode)
+            self.release(worker, reusable)
+        return result
+
+    async def stop(self):
+        self.disabled = True
+        self.idle.clear()
+        await asyncio.gather(*(self.retire(worker) for worker in list(self.workers)), return_exceptions=True)
@@ -0,0 +1,74 @@
+import os
+import shutil
+import stat
+import tempfile
+
+CALLBACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "callback_plugins")
+
+
+class ConnectionProfile:
+    """ how ansible connects to hosts: inventory vars and ansible.cfg shared by every playbook run """
+
+    def __init__(self, connection="paramiko", pipelining=False, control_path_dir="", control_persist="600s"):
+        self.connection = connection
+        self.pipelining = pipelining
+        # ssh master sockets let anyone who can open them log in to hosts, so by default the directory is private
+        # and is removed at stop
+        self.private = not control_path_dir
+        self.control_path_dir = control_path_dir or tempfile.mkdtemp(prefix="deploy_cp_")
+        self.control_persist = control_persist
+        self.config_path = os.path.join(self.control_path_dir, "ansible.cfg")
+
+    @classmethod
+    def from_config(cls, config_settings):
+        return cls(connection=config_settings.get("ANSIBLE", "connection", fallback="paramiko"),
+                   pipelining=config_settings.getboolean("ANSIBLE", "pipelining", fallback=False),
+                   control_path_dir=config_settings.get("ANSIBLE", "control_path_dir", fallback=""),
+                   control_persist=config_settings.get("ANSIBLE", "control_persist", fallback="600s"))
+
+    def inventory_vars(self, python="/usr/bin/python3"):
+        return f' ansible_connection={self.connection} ansible_python_interpreter={python}'
+
+    def config_text(self):
+        text = ('[defaults]\n'
+                'host_key_checking = False\n'
+                f'callback_plugins = {CALLBACK_DIR}\n'
+                'stdout_callback = deploy_events\n'
+                # every connection plugin which supports pipelining reads it here
+                '[connection]\n'
+                f'pipelining = {self.pipelining}\n'
+                '[paramiko_connection]\n'
+                'record_host_keys = False\n'
+                '[ssh_connection]\n'
+                f'pipelining = {self.pipelining}\n')
+        if self.connection == "ssh":
+            # one master connection per host/port/user, later runs reuse it while it persists
+            text += (f'control_path_dir = {self.control_path_dir}\n'
+                     f'control_path = %(directory)s/%%h-%%p-%%r\n'
+                     f'ssh_args = -o ControlMaster=auto -o ControlPersist={self.control_persist}\n')
+        return text
+
+    def write(self):
+        os.makedirs(self.control_path_dir, mode=0o700, exist_ok=True)
+        self.check_owner()
+        with open(self.config_path, 'w') as file:
+            file.write(self.config_text())
+        return self.config_path
+
+    def check_owner(self):
+        """ configured directory may exist already, it has to be a directory of this user closed to others """
+        info = os.lstat(self.control_path_dir)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f'control_path_dir {self.control_path_dir} has to be a directory owned by '
+                                  f'this user with mode 0700')
+
+    def close(self):
+        if self.private:
+            shutil.rmtree(self.control_path_dir, ignore_errors=True)
+
+    def args(self, playbook, inventory, limit):
+        """ ansible-playbook arguments, passed as argv without shell: paths contain hotel_id of client """
+        return [playbook, "-i", inventory, "--limit", limit]
+
+    def environment(self):
+        return dict(os.environ, ANSIBLE_CONFIG=self.config_path)
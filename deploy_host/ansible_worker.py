@@ -0,0 +1,80 @@
+""" Pre-warmed ansible-playbook process of AnsiblePool.
+
+Imports ansible and loads its plugins once, then reads one json job per line on stdin:
+    {"args": ["playbook.yml", "-i", "inventory", "--limit", "10.0.0.1"]}
+    {"ping": true}
+Every playbook runs in a forked child with own copy of the warm interpreter, so state of one run never leaks
+into the next. Child output goes to stdout as from ansible-playbook, worker reports itself with lines
+    {"event": "worker", "state": "ready" | "started" | "exit" | "pong", ...}
+"""
+import json
+import os
+import sys
+import traceback
+import warnings
+
+
+def emit(state, **fields):
+    fields.update(event="worker", state=state)
+    sys.stdout.write(json.dumps(fields) + '\n')
+    sys.stdout.flush()
+
+
+def warm_up():
+    import ansible.cli.playbook  # noqa: F401
+    import ansible.executor.playbook_executor  # noqa: F401
+    import ansible.inventory.manager  # noqa: F401
+    from ansible.plugins.loader import action_loader, callback_loader, connection_loader, init_plugin_loader
+    init_plugin_loader()
+    # every run initializes plugin loader again in its child
+    warnings.filterwarnings("ignore", "AnsibleCollectionFinder has already been configured")
+    # import time of plugins is paid here instead of in every run
+    for loader in (action_loader, callback_loader, connection_loader):
+        for _ in loader.all(class_only=True):
+            pass
+
+
+def run_child(args):
+    returncode = 1
+    try:
+        # own process group, cancelled run is killed with everything it started
+        os.setsid()
+        stdin = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(stdin, 0)
+        emit("started", pid=os.getpid())
+        from ansible.cli.playbook import main
+        main(["ansible-playbook"] + args)
+        returncode = 0
+    except SystemExit as exit:
+        returncode = exit.code if isinstance(exit.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(returncode)
+
+
+def run_job(args):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        run_child(args)
+    _, status = os.waitpid(pid, 0)
+    emit("exit", returncode=os.waitstatus_to_exitcode(status))
+
+
+def main():
+    warm_up()
+    emit("ready", pid=os.getpid())
+    for line in sys.stdin:
+        job = json.loads(line)
+        if job.get("ping"):
+            emit("pong")
+        else:
+            run_job(job["args"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+
+class AptCache:
+    """ local package source for hosts: apt-cacher style proxy or repository directory served by deploy server """
+
+    def __init__(self, mode="off", proxy_url="", repo_dir="apt_repo", repo_url="", cache_dir="", repo_key=""):
+        if mode == "repo" and not repo_url:
+            # server listens on 127.0.0.1, hosts reach repo_dir only through address of reverse proxy
+            raise ValueError('[APT_CACHE] mode=repo needs repo_url of reverse proxy which passes /apt to server')
+        self.mode = mode
+        self.proxy_url = proxy_url
+        self.repo_dir = repo_dir
+        self.repo_url = repo_url
+        self.cache_dir = cache_dir
+        # public key which signed InRelease of repository, without it hosts trust repository unsigned
+        self.repo_key = os.path.abspath(repo_key) if repo_key else ""
+
+    @classmethod
+    def from_config(cls, config_settings):
+        return cls(mode=config_settings.get("APT_CACHE", "mode", fallback="off"),
+                   proxy_url=config_settings.get("APT_CACHE", "proxy_url", fallback=""),
+                   repo_dir=config_settings.get("APT_CACHE", "repo_dir", fallback="apt_repo"),
+                   repo_url=config_settings.get("APT_CACHE", "repo_url", fallback=""),
+                   cache_dir=config_settings.get("APT_CACHE", "cache_dir", fallback=""),
+                   repo_key=config_settings.get("APT_CACHE", "repo_key", fallback=""))
+
+    @property
+    def enabled(self):
+        return self.mode in ("proxy", "repo")
+
+    @property
+    def package_dir(self):
+        return self.repo_dir if self.mode == "repo" else self.cache_dir
+
+    def cached_names(self):
+        """ names of packages which have .deb in cache or repository directory """
+        names = set()
+        if not self.package_dir or not os.path.isdir(self.package_dir):
+            return names
+        for root, dirs, files in os.walk(self.package_dir):
+            for name in files:
+                if name.endswith('.deb'):
+                    names.add(name.split('_')[0])
+        return names
+
+    async def snapshot(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.cached_names)
+
+    @staticmethod
+    def sources(packages, before, after):
+        """ packages by cache directory before and after install: hits had .deb in cache before, misses were
+        fetched into cache by install, uncached are not in cache after install and came from elsewhere.
+        Only names of packages from install list are counted, not their dependencies. Cache directory is shared
+        by all deploys, so counts are approximate per deploy: a package fetched by a deploy of other host
+        running at the same time is a hit, not a miss """
+        sources = {"hits": [], "misses": [], "uncached": []}
+        for package in packages:
+            name = package.split('=')[0]
+            if name in before:
+                sources["hits"].append(package)
+            elif name in after:
+                sources["misses"].append(package)
+            else:
+                sources["uncached"].append(package)
+        return sources
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+
+
+class MemoryBackend:
+    """ jobs and events of one process: workers take jobs from in-process queue, events reach only
+    websockets of this process """
+
+    shared = False
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def start(self, jobs):
+        # server restart: queued jobs and jobs which were running are run again
+        for row in await jobs.store.unfinished():
+            job = await jobs.load(row)
+            await jobs.store.set_status(job)
+            jobs.jobs[job.id] = job
+            self.queue.put_nowait(job)
+
+    async def push(self, job):
+        self.queue.put_nowait(job)
+
+    async def take(self, jobs):
+        return await self.queue.get()
+
+    async def request_cancel(self, job_id):
+        return False
+
+    def depth(self):
+        return self.queue.qsize()
+
+    async def stop(self):
+        pass
+
+
+class SQLiteBackend:
+    """ several worker processes (or servers with one job database file) share jobs and events through sqlite
+    of JobStore. Any process takes the oldest queued job, events stored by one process are published to
+    websockets of the others, cancel of a job is passed to the process which runs it. A process beats every
+    lease / 3 seconds, running jobs of a process which did not beat for lease seconds are queued again """
+
+    shared = True
+
+    def __init__(self, store, poll_interval=0.2, lease=30, log=None):
+        self.store = store
+        self.log = log
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.store.origin = self.owner
+        self.cursor = 0
+        self.beat = 0
+        self.queued = 0
+        self.wake = None
+        self.task = None
+
+    @classmethod
+    def from_config(cls, store, config_settings, log=None):
+        return cls(store, poll_interval=config_settings.getfloat("BACKEND", "poll_interval", fallback=0.2),
+                   lease=config_settings.getint("BACKEND", "lease", fallback=30), log=log)
+
+    async def start(self, jobs):
+        self.wake = asyncio.Event()
+        await self.store.requeue_expired(time.time() - self.lease)
+        # websockets get events stored from now, older ones come by attach
+        self.cursor = await self.store.last_event()
+        self.task = asyncio.create_task(self.run(jobs))
+
+    async def push(self, job):
+        self.wake.set()
+
+    async def take(self, jobs):
+        while True:
+            row = await self.store.claim(self.owner)
+            if row is not None:
+                job = await jobs.load(row[:6])
+                job.cancelled = bool(row[6])
+                return job
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def request_cancel(self, job_id):
+        return await self.store.request_cancel(job_id)
+
+    def depth(self):
+        return self.queued
+
+    async def run(self, jobs):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll(jobs)
+            except Exception as error:
+                # database locked for longer than timeout or gone, next poll tries again
+                if self.log is not None:
+                    self.log.write(f'backend poll failed: {error!r}', task="backend", result='error')
+
+    async def poll(self, jobs):
+        for rowid, job_id, message, origin in await self.store.events_after(self.cursor):
+            self.cursor = rowid
+            if origin != self.owner:
+                jobs.bus.publish(message, f'job:{job_id}')
+        if time.monotonic() - self.beat > self.lease / 3:
+            self.beat = time.monotonic()
+            await self.store.heartbeat(self.owner)
+            await self.store.requeue_expired(time.time() - self.lease)
+            self.queued = await self.store.count_queued()
+            self.wake.set()
+        for job_id in await self.store.cancel_requests(self.owner):
+            await jobs.cancel(job_id)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+
+def backend_from_config(store, config_settings, log=None):
+    kind = config_settings.get("BACKEND", "type", fallback="memory")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend.from_config(store, config_settings, log)
+    raise ValueError(f'unknown backend type {kind!r}, expected memory or sqlite')
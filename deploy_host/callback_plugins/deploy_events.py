@@ -0,0 +1,71 @@
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: deploy_events
+    type: stdout
+    short_description: one json line per play, task, host result and host stats for host_deploy
+    description:
+      - Used by deploy_host.runner to follow playbook progress and read results without parsing text output.
+'''
+
+import json
+
+from ansible.plugins.callback import CallbackBase
+
+MAX_STDOUT_LINES = 200
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'stdout'
+    CALLBACK_NAME = 'deploy_events'
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.play = None
+
+    def emit(self, event, **fields):
+        fields['event'] = event
+        self._display.display(json.dumps(fields, default=str))
+
+    def host_result(self, event, result, **fields):
+        res = result._result
+        stdout_lines = res.get('stdout_lines')
+        if stdout_lines is not None:
+            stdout_lines = stdout_lines[-MAX_STDOUT_LINES:]
+        self.emit(event,
+                  play=self.play,
+                  task=result._task.get_name(),
+                  task_id=result._task._uuid,
+                  host=result._host.get_name(),
+                  changed=res.get('changed', False),
+                  msg=res.get('msg'),
+                  stdout_lines=stdout_lines,
+                  **fields)
+
+    def v2_playbook_on_play_start(self, play):
+        self.play = play.get_name()
+        self.emit('play', play=self.play)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.emit('task', play=self.play, task=task.get_name(), task_id=task._uuid)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.emit('task', play=self.play, task=task.get_name(), task_id=task._uuid)
+
+    def v2_runner_on_ok(self, result):
+        self.host_result('ok', result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.host_result('failed', result, ignored=ignore_errors)
+
+    def v2_runner_on_skipped(self, result):
+        self.host_result('skipped', result)
+
+    def v2_runner_on_unreachable(self, result):
+        self.host_result('unreachable', result)
+
+    def v2_playbook_on_stats(self, stats):
+        for host in sorted(stats.processed):
+            self.emit('stats', host=host, **stats.summarize(host))
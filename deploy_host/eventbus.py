@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import json
+from collections import OrderedDict
+from deploy_host.metrics import websocket_dropped, websocket_send_seconds
+
+
+def event_key(event, number):
+    """ key of message in subscriber queue: progress of one task replaces the previous progress of it,
+    progress keys are tuples and may be dropped, other messages have int keys and are kept """
+    if event is not None and event.get("status") == "queued":
+        return ("queued", event.get("client_ip"), event.get("task"))
+    if event is None or event.get("status") != "processing":
+        return number
+    if event.get("result") is True:
+        return ("processing", event.get("client_ip"), event.get("task"))
+    return ("progress", number)
+
+
+class Subscriber:
+    """ one websocket with own bounded queue and sender task, a slow client delays and loses only its own messages """
+
+    def __init__(self, websocket, queue_size=500):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.pending = OrderedDict()
+        self.numbers = itertools.count()
+        self.topics = set()
+        self.dropped = 0
+        self.ready = asyncio.Event()
+        self.sender = None
+
+    def put(self, message, event=None):
+        key = event_key(event, next(self.numbers))
+        if isinstance(key, int) and event is not None:
+            # result of task makes its queued progress useless
+            self.pending.pop(("processing", event.get("client_ip"), event.get("task")), None)
+        if event is not None and event.get("status") in ("processing", "completed", "broked"):
+            # task left the governor queue, its last position is stale
+            self.pending.pop(("queued", event.get("client_ip"), event.get("task")), None)
+        if key in self.pending:
+            self.pending[key] = message
+        else:
+            if len(self.pending) >= self.queue_size:
+                self.drop()
+            self.pending[key] = message
+        self.ready.set()
+        if self.sender is None:
+            self.sender = asyncio.get_running_loop().create_task(self.run())
+
+    def drop(self):
+        """ drop oldest progress message, oldest message at all when queue has only results """
+        for key in self.pending:
+            if isinstance(key, tuple):
+                del self.pending[key]
+                break
+        else:
+            self.pending.popitem(last=False)
+        self.dropped += 1
+        websocket_dropped.inc()
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.pending:
+                if self.dropped:
+                    message = json.dumps({"task": "Alert", "result": True, "status": "dropped",
+                                          "dropped": self.dropped})
+                    self.dropped = 0
+                else:
+                    message = self.pending.popitem(last=False)[1]
+                try:
+                    with websocket_send_seconds.time():
+                        await self.websocket.send_text(message)
+                except Exception:
+                    self.pending.clear()
+                    return
+
+    def close(self):
+        if self.sender is not None:
+            self.sender.cancel()
+            self.sender = None
+
+
+class EventBus:
+    """ deploy messages published to topics: job:<id>, host:<ip> and * for every message """
+
+    def __init__(self, queue_size=500):
+        self.queue_size = queue_size
+        self.subscribers = {}
+
+    def add(self, websocket):
+        self.subscribers[websocket] = Subscriber(websocket, self.queue_size)
+
+    def remove(self, websocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is not None:
+            subscriber.close()
+
+    def subscribe(self, websocket, topic):
+        self.subscribers[websocket].topics.add(topic)
+
+    def send(self, websocket, message):
+        """ put message to queue of websocket, False when websocket is not connected to the bus """
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return False
+        subscriber.put(message, self.parse(message))
+        return True
+
+    def publish(self, message, *topics):
+        event = self.parse(message)
+        topics = set(topics) | {"*"}
+        if event is not None and event.get("client_ip"):
+            topics.add(f'host:{event["client_ip"]}')
+        for subscriber in self.subscribers.values():
+            if subscriber.topics & topics:
+                subscriber.put(message, event)
+
+    @staticmethod
+    def parse(message):
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return None
+        return event if isinstance(event, dict) else None
@@ -0,0 +1,40 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BlockingExecutor:
+    """ threads for blocking ssh and file calls, bounded in threads and in calls waiting for a thread """
+
+    def __init__(self, max_workers=16, queue_size=256):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="deploy-blocking")
+        self.slots = None
+        self.limit = max_workers + queue_size
+
+    @classmethod
+    def from_config(cls, config_settings):
+        return cls(max_workers=config_settings.getint("EXECUTOR", "max_workers", fallback=16),
+                   queue_size=config_settings.getint("EXECUTOR", "queue_size", fallback=256))
+
+    async def run(self, func, *args, timeout=None, abandon=None):
+        """ run func in thread; on timeout or cancel the caller is released at once, func which has not started
+        is cancelled and result of func which finishes later is passed to abandon, e.g. to close a connection """
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.limit)
+        async with self.slots:
+            future = self.pool.submit(func, *args)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # wrapper future is cancelled anyway, thread future only when func has not started
+                if not future.cancel() and abandon is not None:
+                    future.add_done_callback(lambda done: self.abandon(done, abandon))
+                raise
+
+    @staticmethod
+    def abandon(future, abandon):
+        """ called in the thread of func when it finishes """
+        if not future.cancelled() and future.exception() is None:
+            abandon(future.result())
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
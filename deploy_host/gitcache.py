@@ -0,0 +1,109 @@
+import asyncio
+import base64
+import os
+import time
+from deploy_host.runner import kill_group
+
+
+class GitCacheError(Exception):
+    pass
+
+
+class GitMirrorCache:
+    """ bare mirrors of application repos on deploy server and git bundles of them keyed by commit sha.
+    Hosts get a bundle over ansible connection, so credentials stay here and every revision is fetched once """
+
+    def __init__(self, path="git_cache", url="https://bitbucket.org/{owner}/{repo}.git", login="", password="",
+                 refresh_interval=60, keep_bundles=3, timeout=600):
+        self.path = os.path.abspath(path)
+        self.url = url
+        self.login = login
+        self.password = password
+        self.refresh_interval = refresh_interval
+        self.keep_bundles = keep_bundles
+        self.timeout = timeout
+        self.locks = {}
+        self.refreshed = {}
+
+    @classmethod
+    def from_config(cls, config_settings):
+        return cls(path=config_settings.get("GIT", "cache_dir", fallback="git_cache"),
+                   url=config_settings.get("GIT", "url", fallback="https://bitbucket.org/{owner}/{repo}.git"),
+                   login=config_settings.get("GIT", "git_login", fallback=""),
+                   password=config_settings.get("GIT", "git_password", fallback=""),
+                   refresh_interval=config_settings.getint("GIT", "refresh_interval", fallback=60),
+                   keep_bundles=config_settings.getint("GIT", "keep_bundles", fallback=3),
+                   timeout=config_settings.getint("GIT", "timeout", fallback=600))
+
+    def environment(self):
+        """ credentials go to git as http header through environment, not to remote url or command line """
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if self.login:
+            token = base64.b64encode(f'{self.login}:{self.password}'.encode("utf-8")).decode("ascii")
+            env.update(GIT_CONFIG_COUNT="1", GIT_CONFIG_KEY_0="http.extraHeader",
+                       GIT_CONFIG_VALUE_0=f'Authorization: Basic {token}')
+        return env
+
+    async def git(self, *args, cwd=None):
+        process = await asyncio.create_subprocess_exec(
+            "git", *args, cwd=cwd, env=self.environment(),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            raise GitCacheError(f'git {args[0]} did not finish in {self.timeout}s') from None
+        finally:
+            await asyncio.shield(kill_group(process))
+        if process.returncode != 0:
+            raise GitCacheError(f'git {args[0]} failed: {stderr.decode("utf-8", "replace").strip()}')
+        return stdout.decode("utf-8").strip()
+
+    def inside(self, area, *parts):
+        """ path under area directory of cache, owner and repo come from clients """
+        base = os.path.realpath(os.path.join(self.path, area))
+        path = os.path.realpath(os.path.join(base, *parts))
+        if path == base or os.path.commonpath([path, base]) != base:
+            raise GitCacheError(f'path {os.path.join(*parts)!r} is outside of git cache {area}')
+        return path
+
+    def mirror_path(self, owner, repo):
+        return self.inside("mirrors", owner, f'{repo}.git')
+
+    async def refresh(self, owner, repo):
+        """ clone mirror once, later only fetch new objects; not more often than refresh_interval """
+        mirror = self.mirror_path(owner, repo)
+        if time.monotonic() - self.refreshed.get(mirror, float("-inf")) < self.refresh_interval:
+            return mirror
+        if os.path.isdir(mirror):
+            await self.git("fetch", "--prune", "origin", "+refs/heads/*:refs/heads/*", cwd=mirror)
+        else:
+            os.makedirs(os.path.dirname(mirror), exist_ok=True)
+            await self.git("clone", "--mirror", self.url.format(owner=owner, repo=repo), mirror)
+        self.refreshed[mirror] = time.monotonic()
+        return mirror
+
+    async def bundle(self, owner, repo, branch=None):
+        """ sha of branch head (default branch when None) and path of bundle with it, bundle is made once per sha """
+        key = (owner, repo)
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            mirror = await self.refresh(owner, repo)
+            if branch is None:
+                branch = (await self.git("symbolic-ref", "--short", "HEAD", cwd=mirror))
+            sha = await self.git("rev-parse", "--verify", f'refs/heads/{branch}^{{commit}}', cwd=mirror)
+            directory = self.inside("bundles", owner)
+            path = os.path.join(directory, f'{repo}-{sha}.bundle')
+            if not os.path.exists(path):
+                os.makedirs(directory, exist_ok=True)
+                await self.git("bundle", "create", f'{path}.tmp', f'refs/heads/{branch}', cwd=mirror)
+                os.replace(f'{path}.tmp', path)
+                self.prune(directory, repo)
+        return branch, sha, path
+
+    def prune(self, directory, repo):
+        """ keep only last bundles of repo """
+        bundles = sorted((entry for entry in os.scandir(directory)
+                          if entry.name.startswith(f'{repo}-') and entry.name.endswith('.bundle')),
+                         key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in bundles[self.keep_bundles:]:
+            os.remove(entry.path)
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from deploy_host.metrics import governor_slots
+
+
+def load_per_cpu():
+    return os.getloadavg()[0] / (os.cpu_count() or 1)
+
+
+def available_mb():
+    """ MemAvailable of /proc/meminfo, None where it is unknown """
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class Waiter:
+
+    def __init__(self, session, on_position):
+        self.session = session
+        self.on_position = on_position
+        self.position = None
+        self.granted = asyncio.get_running_loop().create_future()
+
+
+class FairLimit:
+    """ slots of one resource shared by all sessions. Waiting sessions take slots in turn, one waiter of
+    each session per round, so a deploy of many steps does not hold back a deploy which came later.
+    on_position(position) coroutine of waiter is called when its place in the queue changes """
+
+    def __init__(self, name, limit, adaptive=None, check_interval=5):
+        self.name = name
+        self.limit = limit
+        self.adaptive = adaptive
+        self.check_interval = check_interval
+        self.running = 0
+        self.queues = OrderedDict()
+        self.reports = set()
+        self.ticker = None
+
+    def current_limit(self):
+        return self.adaptive() if self.adaptive is not None else self.limit
+
+    @asynccontextmanager
+    async def slot(self, session, on_position=None):
+        await self.acquire(session, on_position)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, session, on_position=None):
+        if not self.queues and self.running < self.current_limit():
+            self.running += 1
+            self.update_metrics()
+            return
+        waiter = Waiter(session, on_position)
+        self.queues.setdefault(session, deque()).append(waiter)
+        if self.adaptive is not None and (self.ticker is None or self.ticker.done()):
+            # limit may grow with falling load while nothing is released
+            self.ticker = asyncio.get_running_loop().create_task(self.tick())
+        self.report()
+        try:
+            await waiter.granted
+        except asyncio.CancelledError:
+            if waiter.granted.cancelled():
+                self.remove(waiter)
+                self.report()
+            else:
+                # slot was granted before cancel reached the waiter
+                self.release()
+            raise
+
+    def release(self):
+        self.running -= 1
+        self.grant()
+
+    def grant(self):
+        while self.queues and self.running < self.current_limit():
+            session, queue = self.queues.popitem(last=False)
+            waiter = queue.popleft()
+            if queue:
+                # session goes to the end of the round
+                self.queues[session] = queue
+            if waiter.granted.done():
+                continue
+            self.running += 1
+            waiter.granted.set_result(True)
+        self.report()
+
+    def remove(self, waiter):
+        queue = self.queues.get(waiter.session)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self.queues[waiter.session]
+
+    def order(self):
+        """ waiters in order they get slots """
+        queues = list(self.queues.values())
+        for depth in range(max(map(len, queues), default=0)):
+            for queue in queues:
+                if depth < len(queue):
+                    yield queue[depth]
+
+    def report(self):
+        waiting = 0
+        for waiting, waiter in enumerate(self.order(), 1):
+            if waiter.position != waiting:
+                waiter.position = waiting
+                if waiter.on_position is not None:
+                    task = asyncio.get_running_loop().create_task(waiter.on_position(waiting))
+                    self.reports.add(task)
+                    task.add_done_callback(self.reports.discard)
+        self.update_metrics(waiting)
+
+    def update_metrics(self, waiting=None):
+        if waiting is None:
+            waiting = sum(map(len, self.queues.values()))
+        governor_slots.set(self.current_limit(), resource=self.name, state="limit")
+        governor_slots.set(self.running, resource=self.name, state="running")
+        governor_slots.set(waiting, resource=self.name, state="waiting")
+
+    async def tick(self):
+        while self.queues:
+            await asyncio.sleep(self.check_interval)
+            self.grant()
+
+
+class Governor:
+    """ server-wide admission for all websocket sessions and jobs: playbook runs and ssh commands.
+    Limit of playbooks goes down when load average per cpu is over max_load and when available memory
+    does not fit playbook_mb more runs above reserve_mb, but never below min_playbooks.
+    Every one of workers server processes has own governor with its share of the limits """
+
+    def __init__(self, max_playbooks=8, min_playbooks=1, max_ssh=20, max_load=1.5, playbook_mb=200,
+                 reserve_mb=512, check_interval=5, workers=1):
+        self.workers = workers
+        max_playbooks = self.share(max_playbooks)
+        self.max_playbooks = max_playbooks
+        self.min_playbooks = self.share(min_playbooks)
+        self.max_load = max_load
+        self.playbook_mb = playbook_mb
+        self.reserve_mb = reserve_mb
+        self.check_interval = check_interval
+        self.checked = None
+        self.checked_limit = max_playbooks
+        self.playbooks = FairLimit("playbook", max_playbooks, self.playbook_limit, check_interval)
+        self.ssh = FairLimit("ssh", self.share(max_ssh))
+
+    @classmethod
+    def from_config(cls, config_settings):
+        return cls(max_playbooks=config_settings.getint("GOVERNOR", "max_playbooks", fallback=8),
+                   min_playbooks=config_settings.getint("GOVERNOR", "min_playbooks", fallback=1),
+                   max_ssh=config_settings.getint("GOVERNOR", "max_ssh", fallback=20),
+                   max_load=config_settings.getfloat("GOVERNOR", "max_load", fallback=1.5),
+                   playbook_mb=config_settings.getint("GOVERNOR", "playbook_mb", fallback=200),
+                   reserve_mb=config_settings.getint("GOVERNOR", "reserve_mb", fallback=512),
+                   check_interval=config_settings.getfloat("GOVERNOR", "check_interval", fallback=5),
+                   workers=config_settings.getint("BACKEND", "workers", fallback=1))
+
+    def share(self, limit):
+        """ part of server-wide limit for one process, at least one slot """
+        return max(1, limit // self.workers)
+
+    def playbook_limit(self):
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < self.check_interval:
+            return self.checked_limit
+        self.checked = now
+        limit = self.max_playbooks
+        load = load_per_cpu()
+        if load > self.max_load:
+            limit = int(limit * self.max_load / load)
+        available = available_mb()
+        if available is not None:
+            # memory of running playbooks is already taken from available, other processes take their shares
+            limit = min(limit, self.playbooks.running
+                        + (available - self.reserve_mb) // self.playbook_mb // self.workers)
+        self.checked_limit = max(self.min_playbooks, limit)
+        return self.checked_limit
@@ -0,0 +1,153 @@
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+import aiofiles
+
+
+class InventoryEntry:
+    """ connection data of one host and its rendered inventory line """
+
+    def __init__(self, key, host_data, line, path):
+        self.key = key
+        self.host_data = host_data
+        self.line = line
+        self.path = path
+        self.users = 0
+        self.used = time.monotonic()
+
+    @property
+    def hotel_id(self):
+        return self.key[0]
+
+
+class InventoryRegistry:
+    """ hosts being deployed keyed by (hotel_id, ip, port), so hotels behind one NAT address do not meet.
+    Every host has own inventory file in a private directory while a deploy uses it, the file with passwords is
+    removed by the last release and written again by next acquire. Entries not used by a deploy are evicted
+    after ttl seconds and, least recently used first, when there are more than max_entries """
+
+    def __init__(self, render_line, base="/dev/shm", max_entries=1000, ttl=3600):
+        self.render_line = render_line
+        if not os.path.isdir(base):
+            base = tempfile.gettempdir()
+        # inventories hold passwords, directory is readable by this user only
+        self.directory = tempfile.mkdtemp(prefix="deploy_inventory_", dir=base)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hotels = {}
+        self.numbers = itertools.count()
+
+    @classmethod
+    def from_config(cls, render_line, config_settings):
+        return cls(render_line, base=config_settings.get("DEPLOY", "workdir_base", fallback="/dev/shm"),
+                   max_entries=config_settings.getint("INVENTORY", "max_entries", fallback=1000),
+                   ttl=config_settings.getint("INVENTORY", "ttl", fallback=3600))
+
+    @staticmethod
+    def key(host_data):
+        return host_data.hotel_id, host_data.client_ip, int(host_data.client_port)
+
+    def render(self, hosts):
+        """ one inventory of any subset of hosts, hosts are host data or registered entries.
+        Hosts are named by ip in inventory, so a subset can not have two hosts behind one address """
+        hosts = [host.host_data if isinstance(host, InventoryEntry) else host for host in hosts]
+        addresses = [host_data.client_ip for host_data in hosts]
+        if len(set(addresses)) != len(addresses):
+            raise ValueError(f'hosts with one ip in one inventory: {", ".join(sorted(addresses))}')
+        return '\n'.join(self.render_line(host_data) for host_data in hosts) + '\n'
+
+    def render_hotel(self, hotel_id):
+        return self.render(self.by_hotel(hotel_id))
+
+    async def acquire(self, host_data):
+        """ register host for a deploy and write its inventory, entry stays until release """
+        key = self.key(host_data)
+        entry = self.entries.get(key)
+        line = self.render_line(host_data)
+        if entry is None:
+            hotel_id, ip, port = key
+            # hotel_id comes from client, it is not a part of file name
+            path = os.path.join(self.directory, f'{ip}_{port}_{next(self.numbers)}')
+            entry = InventoryEntry(key, host_data, line, path)
+            self.entries[key] = entry
+            self.hotels.setdefault(hotel_id, set()).add(key)
+        if entry.line != line or not os.path.exists(entry.path):
+            # new host or credentials changed since last deploy of the host
+            await self.write(entry, host_data, line)
+        entry.users += 1
+        self.touch(entry)
+        self.evict()
+        return entry
+
+    async def refresh(self, host_data):
+        """ write inventory of registered host again when its line changed, facts of host are known only
+        after acquire """
+        entry = self.get(host_data)
+        line = self.render_line(host_data)
+        if entry.line != line:
+            await self.write(entry, host_data, line)
+
+    async def write(self, entry, host_data, line):
+        entry.host_data = host_data
+        entry.line = line
+        async with aiofiles.open(entry.path, 'w') as file:
+            await file.write(self.render([entry]))
+
+    def release(self, host_data):
+        entry = self.entries.get(self.key(host_data))
+        if entry is not None and entry.users > 0:
+            entry.users -= 1
+            self.touch(entry)
+            if entry.users == 0:
+                self.remove_file(entry)
+        self.evict()
+
+    def touch(self, entry):
+        entry.used = time.monotonic()
+        self.entries.move_to_end(entry.key)
+
+    def get(self, host_data):
+        entry = self.entries.get(self.key(host_data))
+        if entry is None:
+            raise KeyError(f'host {host_data.client_ip}:{host_data.client_port} of hotel '
+                           f'{host_data.hotel_id!r} has no inventory')
+        self.touch(entry)
+        return entry
+
+    def path(self, host_data):
+        return self.get(host_data).path
+
+    def by_hotel(self, hotel_id):
+        return [self.entries[key] for key in self.hotels.get(hotel_id, ())]
+
+    def evict(self):
+        expired = time.monotonic() - self.ttl
+        over = len(self.entries) - self.max_entries
+        for entry in list(self.entries.values()):
+            if entry.users == 0 and (over > 0 or entry.used < expired):
+                self.remove(entry)
+                over -= 1
+
+    def remove(self, entry):
+        del self.entries[entry.key]
+        keys = self.hotels[entry.hotel_id]
+        keys.discard(entry.key)
+        if not keys:
+            del self.hotels[entry.hotel_id]
+        self.remove_file(entry)
+
+    @staticmethod
+    def remove_file(entry):
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.entries.clear()
+        self.hotels.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
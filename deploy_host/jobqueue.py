@@ -0,0 +1,346 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from deploy_host.backend import MemoryBackend
+
+SECRET_FIELDS = ("client_password", "client_sudo_password")
+
+
+def redact(data):
+    """ job data without host passwords, kept for finished jobs """
+    data = json.loads(json.dumps(data))
+    for host_data in [data.get("host_data")] + list(data.get("hosts") or []):
+        if isinstance(host_data, dict):
+            for field in SECRET_FIELDS:
+                if field in host_data:
+                    host_data[field] = "***"
+    return data
+
+
+class JobStore:
+    """ jobs and their websocket events in sqlite, every call goes to one thread that owns the connection """
+
+    def __init__(self, path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobstore")
+        self.connection = None
+        # process which stores events, other processes of shared backend publish only events of others
+        self.origin = None
+
+    def _connect(self):
+        if self.connection is None:
+            exists = os.path.exists(self.path)
+            # several processes may write with shared backend, a writer waits for the lock of another
+            self.connection = sqlite3.connect(self.path, timeout=30)
+            if not exists:
+                # passwords of queued jobs are stored until the job is finished
+                os.chmod(self.path, 0o600)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(
+                'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, data TEXT, status TEXT,'
+                ' created REAL, updated REAL, attempts INTEGER DEFAULT 0);'
+                'CREATE TABLE IF NOT EXISTS events (job_id TEXT, seq INTEGER, message TEXT,'
+                ' PRIMARY KEY (job_id, seq));')
+            self._add_columns('jobs', owner='TEXT', heartbeat='REAL', cancel='INTEGER DEFAULT 0')
+            self._add_columns('events', origin='TEXT')
+        return self.connection
+
+    def _add_columns(self, table, **columns):
+        """ columns of shared backend added to database of older version """
+        existing = {row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')}
+        for name, kind in columns.items():
+            if name not in existing:
+                try:
+                    self.connection.execute(f'ALTER TABLE {table} ADD COLUMN {name} {kind}')
+                except sqlite3.OperationalError:
+                    # added by another process at the same time
+                    pass
+
+    async def call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _execute(self, query, params=()):
+        connection = self._connect()
+        with connection:
+            return connection.execute(query, params).fetchall()
+
+    async def add(self, job):
+        await self.call(self._execute, 'INSERT INTO jobs (id, kind, data, status, created, updated) VALUES (?, ?, ?, ?, ?, ?)',
+                        (job.id, job.kind, json.dumps(job.data), job.status, job.created, job.created))
+
+    async def set_status(self, job, data=None):
+        if data is None:
+            await self.call(self._execute, 'UPDATE jobs SET status = ?, updated = ?, attempts = ? WHERE id = ?',
+                            (job.status, time.time(), job.attempts, job.id))
+        else:
+            await self.call(self._execute, 'UPDATE jobs SET status = ?, updated = ?, attempts = ?, data = ? WHERE id = ?',
+                            (job.status, time.time(), job.attempts, json.dumps(data), job.id))
+
+    async def add_event(self, job, seq, message):
+        await self.call(self._execute, 'INSERT INTO events (job_id, seq, message, origin) VALUES (?, ?, ?, ?)',
+                        (job.id, seq, message, self.origin))
+
+    async def events(self, job_id, since=0):
+        rows = await self.call(self._execute, 'SELECT message FROM events WHERE job_id = ? AND seq >= ? ORDER BY seq',
+                               (job_id, since))
+        return [row[0] for row in rows]
+
+    async def get(self, job_id):
+        rows = await self.call(self._execute, 'SELECT id, kind, data, status, created, attempts FROM jobs WHERE id = ?',
+                               (job_id,))
+        return rows[0] if rows else None
+
+    async def unfinished(self):
+        return await self.call(self._execute, 'SELECT id, kind, data, status, created, attempts FROM jobs'
+                                              " WHERE status IN ('queued', 'running') ORDER BY created")
+
+    async def claim(self, owner):
+        """ oldest queued job taken by owner, None when nothing is queued; one UPDATE, so two processes
+        never take the same job """
+        now = time.time()
+        rows = await self.call(self._execute, "UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, updated = ?"
+                                              " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1)"
+                                              ' RETURNING id, kind, data, status, created, attempts, cancel',
+                               (owner, now, now))
+        return rows[0] if rows else None
+
+    async def heartbeat(self, owner):
+        await self.call(self._execute, "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'",
+                        (time.time(), owner))
+
+    async def requeue_expired(self, before):
+        """ running jobs of owners which stopped to beat go back to queue """
+        await self.call(self._execute, "UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running'"
+                                       ' AND (heartbeat IS NULL OR heartbeat < ?)', (before,))
+
+    async def request_cancel(self, job_id):
+        rows = await self.call(self._execute, "UPDATE jobs SET cancel = 1 WHERE id = ? AND status IN ('queued', 'running')"
+                                              ' RETURNING id', (job_id,))
+        return bool(rows)
+
+    async def cancel_requests(self, owner):
+        rows = await self.call(self._execute, "SELECT id FROM jobs WHERE owner = ? AND status = 'running' AND cancel = 1",
+                               (owner,))
+        return [row[0] for row in rows]
+
+    async def count_queued(self):
+        rows = await self.call(self._execute, "SELECT COUNT(*) FROM jobs WHERE status = 'queued'")
+        return rows[0][0]
+
+    async def last_event(self):
+        rows = await self.call(self._execute, 'SELECT COALESCE(MAX(rowid), 0) FROM events')
+        return rows[0][0]
+
+    async def events_after(self, rowid, limit=1000):
+        """ events of all jobs stored after rowid, in order they were stored """
+        return await self.call(self._execute, 'SELECT rowid, job_id, message, origin FROM events WHERE rowid > ?'
+                                              ' ORDER BY rowid LIMIT ?', (rowid, limit))
+
+    async def purge(self, before):
+        await self.call(self._execute, 'DELETE FROM events WHERE job_id IN'
+                                       " (SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?)",
+                        (before,))
+        await self.call(self._execute, "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?", (before,))
+
+    async def close(self):
+        if self.connection is not None:
+            await self.call(self.connection.close)
+            self.connection = None
+        self.executor.shutdown(wait=False)
+
+
+class DeployJob:
+    """ one deploy, used as websocket by deploy code: every message is stored and published to job topic """
+
+    def __init__(self, store, bus, kind, data, job_id=None, status="queued", created=None, attempts=0, events=0):
+        self.store = store
+        self.bus = bus
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.data = data
+        self.status = status
+        self.created = created or time.time()
+        self.attempts = attempts
+        self.seq = events
+        self.task = None
+        self.cancelled = False
+
+    async def send_text(self, message):
+        seq = self.seq
+        self.seq += 1
+        # published before it is stored, clients subscribed while it is stored get it from replay
+        self.bus.publish(message, self.topic)
+        await self.store.add_event(self, seq, message)
+
+    @property
+    def topic(self):
+        return f'job:{self.id}'
+
+    def completed_steps(self, events):
+        """ steps per host which were completed in events of previous attempt """
+        completed = {}
+        for message in events:
+            try:
+                event = json.loads(message)
+            except ValueError:
+                continue
+            if event.get("result") is True and event.get("status") == "completed" and event.get("client_ip"):
+                completed.setdefault(event["client_ip"], []).append(event["task"])
+        return completed
+
+    def info(self):
+        return {"task": "job", "job_id": self.id, "kind": self.kind, "job_status": self.status,
+                "attempts": self.attempts}
+
+
+class JobQueue:
+    """ deploy jobs run by a pool of workers, not by websocket coroutine; jobs interrupted by restart are resumed.
+    backend decides which process runs a job and how its events reach websockets of other processes """
+
+    def __init__(self, store, bus, runners, workers=2, keep_days=7, max_attempts=3, cancel_on_disconnect=False,
+                 backend=None):
+        self.store = store
+        self.bus = bus
+        self.runners = runners
+        self.workers = workers
+        self.keep_days = keep_days
+        self.max_attempts = max_attempts
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.backend = backend or MemoryBackend()
+        # jobs run or queued in this process
+        self.jobs = {}
+        # websocket which submitted job, for cancel_on_disconnect
+        self.owners = {}
+        self.followers = set()
+        self.tasks = []
+
+    async def start(self):
+        await self.store.purge(time.time() - self.keep_days * 86400)
+        await self.backend.start(self)
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def load(self, row):
+        """ job of stored row, steps completed by attempt which was interrupted are not run again """
+        job_id, kind, data, status, created, attempts = row
+        events = await self.store.events(job_id)
+        job = DeployJob(self.store, self.bus, kind, json.loads(data), job_id, "queued", created, attempts,
+                        len(events))
+        if attempts:
+            job.data["resume"] = job.completed_steps(events)
+        return job
+
+    async def submit(self, kind, data, websocket=None):
+        job = DeployJob(self.store, self.bus, kind, data)
+        if websocket is not None:
+            self.owners[job.id] = websocket
+            self.bus.subscribe(websocket, job.topic)
+        # first event is stored before the job, a process which claims the job continues after it
+        await job.send_text(json.dumps(dict(job.info(), result=True, status="queued")))
+        await self.store.add(job)
+        if not self.backend.shared:
+            self.jobs[job.id] = job
+        await self.backend.push(job)
+        return job
+
+    async def attach(self, job_id, websocket, since=0):
+        """ queue events of job from since and subscribe to its next events; False when job is unknown """
+        job = self.jobs.get(job_id)
+        row = None
+        if job is None:
+            row = await self.store.get(job_id)
+            if row is None:
+                return False
+        while True:
+            messages = await self.store.events(job_id, since)
+            for message in messages:
+                self.bus.send(websocket, message)
+            since += len(messages)
+            if job is None:
+                if self.backend.shared and row[3] in ("queued", "running"):
+                    task = asyncio.create_task(self.follow(job_id, websocket, since))
+                    self.followers.add(task)
+                    task.add_done_callback(self.followers.discard)
+                return True
+            if job.status not in ("queued", "running"):
+                return True
+            if since >= job.seq:
+                self.bus.subscribe(websocket, job.topic)
+                return True
+
+    async def follow(self, job_id, websocket, since):
+        """ events of job of another process for attached websocket, read from store until job is finished """
+        finished = False
+        while not finished and websocket in self.bus.subscribers:
+            await asyncio.sleep(self.backend.poll_interval)
+            row = await self.store.get(job_id)
+            finished = row is None or row[3] not in ("queued", "running")
+            messages = await self.store.events(job_id, since)
+            for message in messages:
+                self.bus.send(websocket, message)
+            since += len(messages)
+
+    async def cancel(self, job_id):
+        """ cancel queued or running job, False when job is not active """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return await self.backend.request_cancel(job_id)
+        if not job.cancelled:
+            job.cancelled = True
+            if job.task is not None:
+                job.task.cancel()
+        return True
+
+    async def disconnected(self, websocket):
+        """ with cancel_on_disconnect jobs of websocket which nobody else watches are cancelled """
+        owned = [job_id for job_id, owner in self.owners.items() if owner is websocket]
+        for job_id in owned:
+            del self.owners[job_id]
+        if not self.cancel_on_disconnect:
+            return
+        watched = set().union(*(subscriber.topics for subscriber in self.bus.subscribers.values()))
+        for job_id in owned:
+            if f'job:{job_id}' not in watched:
+                await self.cancel(job_id)
+
+    async def worker(self):
+        while True:
+            job = await self.backend.take(self)
+            self.jobs[job.id] = job
+            await self.run(job)
+
+    async def run(self, job):
+        job.status = "running"
+        job.attempts += 1
+        await self.store.set_status(job)
+        try:
+            if job.attempts > self.max_attempts:
+                raise RuntimeError(f'job was interrupted {job.attempts - 1} times')
+            if not job.cancelled:
+                # own task, so one job can be cancelled without its worker
+                job.task = asyncio.create_task(self.runners[job.kind](job.data, job))
+                await job.task
+            job.status = "cancelled" if job.cancelled else "done"
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                # server stops, job stays running and is resumed on next start
+                raise
+            job.status = "cancelled"
+        except Exception as error:
+            job.status = "failed"
+            await job.send_text(json.dumps({"task": "job", "job_id": job.id, "result": False, "status": str(error)}))
+        await job.send_text(json.dumps(dict(job.info(), result=job.status == "done", status=job.status)))
+        await self.store.set_status(job, redact(job.data))
+        del self.jobs[job.id]
+        self.owners.pop(job.id, None)
+
+    async def stop(self):
+        """ stop workers, running jobs stay in running state and are resumed on next start """
+        for task in self.tasks + list(self.followers):
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.followers, return_exceptions=True)
+        await self.backend.stop()
+        await self.store.close()
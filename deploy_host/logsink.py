@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+
+class LogSink:
+    """ json lines log, callers put records to queue and one background task writes them in batches """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, batch_size=200, queue_size=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.queue = None
+        self.writer = None
+        self.file = None
+        self.dropped = 0
+
+    @classmethod
+    def from_config(cls, path, config_settings):
+        return cls(path,
+                   max_bytes=config_settings.getint("LOG", "max_bytes", fallback=10 * 1024 * 1024),
+                   backups=config_settings.getint("LOG", "backups", fallback=5))
+
+    def write(self, message, **fields):
+        """ fields are hotel_id, client_ip, task, duration, result; None values are skipped """
+        record = {"time": datetime.now().isoformat(timespec="milliseconds"), "message": message}
+        record.update((key, value) for key, value in fields.items() if value is not None)
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_lines([line])
+            return
+        if self.writer is None or self.writer.done():
+            if self.queue is None:
+                self.queue = asyncio.Queue(self.queue_size)
+            self.writer = loop.create_task(self.run())
+        try:
+            self.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lines = [await self.queue.get()]
+            while len(lines) < self.batch_size and not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            try:
+                await loop.run_in_executor(None, self._write_lines, lines)
+            except OSError as error:
+                print("log write error", error)
+            finally:
+                for _ in lines:
+                    self.queue.task_done()
+
+    def _write_lines(self, lines):
+        if self.dropped:
+            lines = lines + [json.dumps({"time": datetime.now().isoformat(timespec="milliseconds"),
+                                         "message": f"{self.dropped} log records dropped, queue is full"}) + '\n']
+            self.dropped = 0
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(''.join(lines))
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{index}'):
+                os.replace(f'{self.path}.{index}', f'{self.path}.{index + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    async def stop(self):
+        """ wait until queued records are written and close file """
+        if self.writer is not None and not self.writer.done():
+            await self.queue.join()
+            self.writer.cancel()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,157 @@
+import bisect
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, self.labels, key, value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, labels, key, value in self.samples():
+            lines.append(f'{name}{label_text(labels, key)} {value:g}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        self.values[self.key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is not None:
+            self.values[()] = self.function()
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        if key not in self.values:
+            self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+        counts = self.values[key]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            counts[0][index] += 1
+        counts[1] += 1
+        counts[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        labels = self.labels + ("le",)
+        for key, (buckets, count, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, buckets):
+                cumulative += bucket
+                yield f'{self.name}_bucket', labels, key + (f'{bound:g}',), cumulative
+            yield f'{self.name}_bucket', labels, key + ("+Inf",), count
+            yield f'{self.name}_count', self.labels, key, count
+            yield f'{self.name}_sum', self.labels, key, total
+
+
+class Registry:
+    """ metrics of this process in prometheus text format """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), function=None):
+        return self.add(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+registry = Registry()
+
+step_seconds = registry.histogram("deploy_step_seconds", "Time of deploy step phases: render, queue, spawn, "
+                                  "execute, parse, total", ("step", "phase"))
+steps_total = registry.counter("deploy_steps_total", "Finished deploy steps", ("step", "result"))
+active_deploys = registry.gauge("deploy_active", "Hosts being deployed now")
+check_password_seconds = registry.histogram("deploy_check_password_seconds", "Time of check_password", ("result",))
+ssh_connect_seconds = registry.histogram("deploy_ssh_connect_seconds", "Time to open pooled ssh session")
+ssh_exec_seconds = registry.histogram("deploy_ssh_exec_seconds", "Time of command over pooled ssh session")
+ansible_running = registry.gauge("deploy_ansible_processes", "Running ansible-playbook processes")
+ansible_total = registry.counter("deploy_ansible_processes_total", "Finished ansible-playbook processes",
+                                 ("returncode",))
+ansible_worker_starts = registry.counter("deploy_ansible_worker_starts_total", "Started pre-warmed ansible workers",
+                                         ("reason",))
+governor_slots = registry.gauge("deploy_governor_slots", "Governed playbook and ssh slots: limit, running, waiting",
+                                ("resource", "state"))
+websocket_send_seconds = registry.histogram("deploy_websocket_send_seconds", "Time of one websocket send",
+                                            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+websocket_dropped = registry.counter("deploy_websocket_dropped_total", "Messages dropped from full client queues")
+loop_lag_seconds = registry.histogram("deploy_loop_lag_seconds", "Event loop lag measured by watchdog",
+                                      buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+loop_stalls = registry.counter("deploy_loop_stalls_total", "Event loop stalls longer than watchdog threshold")
+
+active_deploys.set(0)
+ansible_running.set(0)
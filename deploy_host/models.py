@@ -0,0 +1,134 @@
+import ipaddress
+import re
+from typing import Dict, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator
+
+
+class Message(BaseModel):
+    """ websocket message parsed once, fields are stripped and objects can not be changed """
+    model_config = ConfigDict(frozen=True, str_strip_whitespace=True)
+
+
+def check_ipv4(value, info):
+    try:
+        ipaddress.IPv4Address(value)
+    except ValueError:
+        raise ValueError(f'{info.field_name} field should be IPv4')
+    return value
+
+
+def check_not_empty(value, info):
+    if value == '':
+        raise ValueError(f'{info.field_name} field cannot be empty')
+    return value
+
+
+def check_path_name(value, info):
+    """ value becomes a directory name on deploy server, so it can not leave the directory """
+    if value and (value in ('.', '..') or not re.fullmatch(r'[A-Za-z0-9_.-]+', value)):
+        raise ValueError(f'{info.field_name} field may contain only letters, digits, "_", "." and "-"')
+    return value
+
+
+def check_hostname(value, info):
+    """ value is set as hostname of host, so it has to be a hostname label of RFC 1123 """
+    if value and not re.fullmatch(r'[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?', value):
+        raise ValueError(f'{info.field_name} field may contain only letters, digits and "-" inside, up to 63 characters')
+    return value
+
+
+class HostCredentials(Message):
+    client_login: str
+    client_ip: str
+    client_port: int
+    client_password: str
+    client_sudo_password: str
+    hotel_id: str = ''
+
+    _check_ip = field_validator('client_ip')(check_ipv4)
+    _check_empty = field_validator('client_login', 'client_password', 'client_sudo_password')(check_not_empty)
+    _check_hotel_id = field_validator('hotel_id')(check_path_name)
+
+
+class HostData(HostCredentials):
+    hostname: str
+    hotel_id: str
+    uplink_interface: str
+
+    _check_host = field_validator('hostname', 'hotel_id', 'uplink_interface')(check_not_empty)
+    _check_hostname = field_validator('hostname')(check_hostname)
+
+
+class DhcpData(Message):
+    dhcp_status: bool = False
+    dhcp_network: Optional[str] = None
+    dhcp_mask: Optional[str] = None
+    dhcp_range_start: Optional[str] = None
+    dhcp_range_end: Optional[str] = None
+    dhcp_dns: Optional[str] = None
+    domain_name: Optional[str] = None
+    dhcp_gateway: Optional[str] = None
+    dhcp_broadcast: Optional[str] = None
+    dhcp_interface: Optional[str] = None
+
+    @model_validator(mode='after')
+    def check_enabled(self):
+        """ settings are required only when dhcp server is installed """
+        if not self.dhcp_status:
+            return self
+        for name in type(self).model_fields:
+            value = getattr(self, name)
+            if value is None or value == '':
+                raise ValueError(f'{name} field cannot be empty')
+            if name not in ('dhcp_status', 'domain_name', 'dhcp_interface'):
+                try:
+                    ipaddress.IPv4Address(value)
+                except ValueError:
+                    raise ValueError(f'{name} field should be IPv4')
+        return self
+
+
+class PasswordRequest(Message):
+    task: str
+    host_data: HostCredentials
+
+
+class DeploySettings(Message):
+    task: str
+    dhcp: DhcpData = DhcpData()
+    install_list: Tuple[str, ...] = ()
+    git: Tuple[str, ...] = ()
+    git_login: str = ''
+    password_status: bool = False
+    force: bool = False
+    # steps per host completed before restart of resumed job
+    resume: Dict[str, Tuple[str, ...]] = {}
+
+    _check_git_login = field_validator('git_login')(check_path_name)
+
+    @field_validator('install_list', 'git', mode='before')
+    @classmethod
+    def split_names(cls, value):
+        if isinstance(value, str):
+            return value.split()
+        return value
+
+    def packages(self):
+        """ packages of install_list and dhcp server when it is installed """
+        packages = list(self.install_list)
+        if self.dhcp.dhcp_status and "isc-dhcp-server" not in packages:
+            packages.append("isc-dhcp-server")
+        return packages
+
+
+class DeployRequest(DeploySettings):
+    host_data: HostData
+
+
+class FleetRequest(DeploySettings):
+    hosts: Tuple[HostData, ...] = ()
+
+    def host_request(self, host_data):
+        """ request of one host of fleet, fields are validated already """
+        fields = {name: getattr(self, name) for name in DeploySettings.model_fields}
+        return DeployRequest.model_construct(host_data=host_data, **fields)
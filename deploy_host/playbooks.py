@@ -0,0 +1,73 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import aiofiles
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# files of deploy server copied to host by a playbook
+SOURCE = re.compile(r'^\s*src:\s*["\']?([^"\'\s]+)', re.MULTILINE)
+
+
+def source_stats(path):
+    """ size and mtime of server file, or of every file of directory, to find out that it was changed """
+    if not os.path.isdir(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return f'{path} missing'
+        return f'{path} {stat.st_size} {stat.st_mtime_ns}'
+    stats = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            stats.append(source_stats(os.path.join(root, name)))
+    return '\n'.join(stats)
+
+
+class PlaybookTemplates:
+    """ playbook and config templates, compiled once at start and rendered per host """
+
+    def __init__(self, path=TEMPLATE_DIR):
+        self.environment = Environment(loader=FileSystemLoader(path), undefined=StrictUndefined,
+                                       keep_trailing_newline=True, autoescape=False)
+        # "# version:" line of a template is rendered into playbook, so it is a part of state digest
+        self.templates = {name: self.environment.get_template(name)
+                          for name in self.environment.list_templates(extensions=["j2"])}
+
+    def render(self, name, data, **context):
+        return self.templates[name].render(data=data, host=data.host_data, dhcp=data.dhcp, **context)
+
+
+class DeployWorkdir:
+    """ directory for rendered playbooks of one deploy, on tmpfs when it exists, removed in one shot """
+
+    def __init__(self, prefix, base="/dev/shm"):
+        if not os.path.isdir(base):
+            base = tempfile.gettempdir()
+        self.path = tempfile.mkdtemp(prefix=f'{prefix}_', dir=base)
+        self.files = {}
+
+    async def write(self, name, text):
+        async with aiofiles.open(os.path.join(self.path, name), 'w') as file:
+            await file.write(text)
+        self.files[file.name] = text
+        return file
+
+    def digest(self, playbook):
+        """ hash of rendered playbook, workdir files it uses and server files it copies, same for same
+        desired state """
+        content = hashlib.sha256(playbook.replace(self.path, '<workdir>').encode("utf-8"))
+        for path in sorted(self.files):
+            if path in playbook:
+                content.update(os.path.basename(path).encode("utf-8"))
+                content.update(self.files[path].encode("utf-8"))
+        for path in sorted(set(SOURCE.findall(playbook))):
+            if not path.startswith(self.path + os.sep):
+                content.update(source_stats(path).encode("utf-8"))
+        return content.hexdigest()
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import time
+
+# sudo password is the first line of stdin, every fact is printed as key=value
+PROBE_SCRIPT = r'''
+read -r pw
+echo "sudo=$(echo "$pw" | sudo -S -p '' -l 2>/dev/null | grep -cE '\(ALL( : ALL)?\) (NOPASSWD: )?ALL')"
+echo "interfaces=$(ls /sys/class/net/ | tr '\n' ' ')"
+echo "os=$(. /etc/os-release 2>/dev/null && echo "$ID $VERSION_ID")"
+echo "disk_free_kb=$(df -Pk / | awk 'NR==2 {print $4}')"
+echo "python=$(command -v python3)"
+if ! command -v fuser >/dev/null 2>&1; then echo "apt_locked=unknown"
+elif echo "$pw" | sudo -S -p '' fuser /var/lib/dpkg/lock-frontend /var/lib/dpkg/lock /var/lib/apt/lists/lock >/dev/null 2>&1
+then echo "apt_locked=yes"; else echo "apt_locked=no"; fi
+if [ -f /etc/cloud/cloud.cfg ]; then echo "cloud_cfg=yes"; else echo "cloud_cfg=no"; fi
+'''
+
+FACT_KEYS = ("sudo", "interfaces", "os", "disk_free_kb", "python", "apt_locked", "cloud_cfg")
+
+
+class HostFacts:
+    """ facts of one host from probe script """
+
+    def __init__(self, values):
+        self.sudo = values.get("sudo", "0") not in ("", "0")
+        self.interfaces = values.get("interfaces", "").split()
+        self.os = values.get("os", "")
+        self.disk_free_mb = int(values.get("disk_free_kb") or 0) // 1024
+        self.python = values.get("python", "")
+        self.apt_locked = values.get("apt_locked", "unknown")
+        self.cloud_cfg = values.get("cloud_cfg") == "yes"
+        self.checked = time.monotonic()
+
+    @classmethod
+    def parse(cls, output):
+        """ pty output has echoed input and \r\n, only known key=value lines are taken """
+        values = {}
+        for line in output.splitlines():
+            key, sep, value = line.strip('\r').partition('=')
+            if sep and key in FACT_KEYS:
+                values[key] = value.strip()
+        return cls(values)
+
+    def problems(self, min_free_mb):
+        """ reasons why deploy will fail on host """
+        problems = []
+        if not self.sudo:
+            problems.append("sudo password is incorrect or user has no sudo rights")
+        if not self.python:
+            problems.append("python3 is not installed")
+        if self.disk_free_mb < min_free_mb:
+            problems.append(f'{self.disk_free_mb} MB free on /, {min_free_mb} MB needed')
+        if self.apt_locked == "yes":
+            problems.append("apt is locked by other process")
+        return problems
+
+    def as_dict(self):
+        return {"sudo": self.sudo, "interfaces": self.interfaces, "os": self.os, "disk_free_mb": self.disk_free_mb,
+                "python": self.python, "apt_locked": self.apt_locked, "cloud_cfg": self.cloud_cfg}
+
+
+class Preflight:
+    """ one probe script per host over pooled ssh session, facts are cached for ttl seconds """
+
+    def __init__(self, ssh_pool, ttl=300, min_free_mb=1024, timeout=20):
+        self.ssh_pool = ssh_pool
+        self.ttl = ttl
+        self.min_free_mb = min_free_mb
+        self.timeout = timeout
+        self.facts_cache = {}
+        self.probing = {}
+
+    @classmethod
+    def from_config(cls, ssh_pool, config_settings):
+        return cls(ssh_pool,
+                   ttl=config_settings.getint("PREFLIGHT", "ttl", fallback=300),
+                   min_free_mb=config_settings.getint("PREFLIGHT", "min_free_mb", fallback=1024))
+
+    @staticmethod
+    def sudo_hash(host_data):
+        return hashlib.sha256(host_data.client_sudo_password.encode("utf-8")).hexdigest()
+
+    def cached(self, host_data):
+        """ facts of host not older than ttl, None when host has to be probed again """
+        entry = self.facts_cache.get(self.ssh_pool.host_key(host_data))
+        if entry is None:
+            return None
+        sudo_hash, facts = entry
+        if sudo_hash != self.sudo_hash(host_data) or time.monotonic() - facts.checked > self.ttl:
+            return None
+        return facts
+
+    async def facts(self, host_data, refresh=False):
+        facts = None if refresh else self.cached(host_data)
+        if facts is not None:
+            return facts
+        key = self.ssh_pool.host_key(host_data)
+        # callers which probe the same host at once wait for one probe
+        if key not in self.probing:
+            self.probing[key] = asyncio.ensure_future(self.probe(host_data))
+            self.probing[key].add_done_callback(lambda _: self.probing.pop(key, None))
+        return await asyncio.shield(self.probing[key])
+
+    async def probe(self, host_data):
+        output = await self.ssh_pool.run(host_data, PROBE_SCRIPT, host_data.client_sudo_password + '\n',
+                                         timeout=self.timeout)
+        facts = HostFacts.parse(output)
+        self.facts_cache[self.ssh_pool.host_key(host_data)] = (self.sudo_hash(host_data), facts)
+        return facts
+
+    async def gather(self, hosts):
+        """ facts of every host probed at the same time, exception in place of facts of failed host """
+        results = await asyncio.gather(*(self.facts(host_data) for host_data in hosts), return_exceptions=True)
+        return {host_data.client_ip: result for host_data, result in zip(hosts, results)}
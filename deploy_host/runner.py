@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import signal
+import time
+from collections import deque
+from deploy_host.metrics import ansible_running, ansible_total
+
+
+class TaskResult:
+    """ result of one task on one host from deploy_events callback """
+
+    def __init__(self, event):
+        self.play = event.get("play")
+        self.task = event.get("task")
+        self.task_id = event.get("task_id")
+        self.host = event.get("host")
+        self.status = event["event"]
+        self.changed = event.get("changed", False)
+        self.ignored = event.get("ignored", False)
+        self.msg = event.get("msg")
+        self.stdout_lines = event.get("stdout_lines")
+
+    @property
+    def failed(self):
+        return self.status in ("failed", "unreachable")
+
+
+class PlaybookResult:
+    """ per host stats and per task results of one ansible-playbook run """
+
+    def __init__(self, tail=200):
+        self.returncode = None
+        self.stats = {}
+        self.plays = {}
+        self.results = {}
+        self.output = deque(maxlen=tail)
+        # seconds of spawn, execute and parse phases of run
+        self.timings = {}
+
+    def add(self, event):
+        kind = event["event"]
+        if kind == "play":
+            self.plays.setdefault(event["play"], [])
+        elif kind == "task":
+            self.plays.setdefault(event["play"], []).append(event["task_id"])
+        elif kind == "stats":
+            self.stats[event["host"]] = {key: value for key, value in event.items() if key not in ("event", "host")}
+        elif kind in ("ok", "failed", "skipped", "unreachable"):
+            result = TaskResult(event)
+            self.results[(result.task_id, result.host)] = result
+
+    def host_stats(self, host):
+        return self.stats.get(host)
+
+    def succeeded(self, host):
+        """ host finished playbook without failed or unreachable tasks """
+        stats = self.stats.get(host)
+        return stats is not None and stats.get("failures", 0) == 0 and stats.get("unreachable", 0) == 0
+
+    def play_results(self, play, host):
+        """ results of every started task of play for host, None for task without result """
+        return [self.results.get((task_id, host)) for task_id in self.plays.get(play, [])]
+
+    def play_succeeded(self, play, host):
+        results = self.play_results(play, host)
+        return bool(results) and all(result is not None and not result.failed for result in results)
+
+    def first_play(self):
+        return next(iter(self.plays), None)
+
+
+async def read_events(stream, result, on_event=None, on_output=None):
+    """ add events of output lines to result until end of stream or line of ansible_worker,
+    return that worker line, None at end of stream. Other lines go to on_output(line) """
+    parse = 0.0
+    try:
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # line longer than limit, it is dropped
+                continue
+            if not line:
+                return None
+            parse_started = time.perf_counter()
+            line = line.decode("utf-8", "replace").rstrip()
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            if not isinstance(event, dict) or "event" not in event:
+                if on_output is not None:
+                    on_output(line)
+                result.output.append(line)
+                parse += time.perf_counter() - parse_started
+                continue
+            if event["event"] == "worker":
+                return event
+            result.add(event)
+            parse += time.perf_counter() - parse_started
+            if on_event is not None:
+                await on_event(event)
+    finally:
+        result.timings["parse"] = result.timings.get("parse", 0.0) + parse
+
+
+async def kill_group(process):
+    """ kill process started with start_new_session and everything it started, then reap it """
+    if process.returncode is None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+async def stream_playbook(args, env=None, on_event=None, tail=200, on_output=None):
+    """ run ansible-playbook with deploy_events callback, pass every event to on_event while it runs.
+    Only results and last tail lines of other output are kept, so memory does not grow with output """
+    result = PlaybookResult(tail)
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        "ansible-playbook", *args,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        limit=1024 * 1024,
+        start_new_session=True)
+    spawned = time.perf_counter()
+    result.timings["spawn"] = spawned - started
+    ansible_running.inc()
+    try:
+        await read_events(process.stdout, result, on_event, on_output)
+        result.returncode = await process.wait()
+    finally:
+        # cancelled or timed out run does not leave ansible and its ssh children behind
+        await asyncio.shield(kill_group(process))
+        ansible_running.dec()
+        ansible_total.inc(returncode=process.returncode)
+    result.timings["execute"] = time.perf_counter() - spawned
+    return result
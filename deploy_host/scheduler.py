@@ -0,0 +1,60 @@
+import asyncio
+
+
+def step_deps(step):
+    """ dependencies and order-only dependencies of (coroutine function, dependencies[, after]) """
+    return tuple(step[1]), tuple(step[2]) if len(step) > 2 else ()
+
+
+def graph_order(steps):
+    """ names of steps in dependency order, dependencies missing from graph are ignored """
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visit":
+            raise ValueError(f'dependency cycle: {" -> ".join(path + [name])}')
+        state[name] = "visit"
+        for dep in sum(step_deps(steps[name]), ()):
+            if dep in steps:
+                visit(dep, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in steps:
+        visit(name, [])
+    return order
+
+
+async def run_graph(steps, limit):
+    """ run steps {name: (coroutine function, dependencies[, after])}, every step starts as soon as
+    its dependencies and steps of after are finished and no more than limit steps run at once. Step fails when
+    it raises or returns False, steps which depend on a failed step are not run and fail too; steps of after
+    only order the run, for steps which use the same resource on host, their failure does not skip the step.
+    Returns errors {name: exception}, skipped steps {name: failed dependency} and names of steps which ran
+    and failed """
+    semaphore = asyncio.Semaphore(limit)
+    tasks = {}
+    skipped = {}
+
+    async def run(name):
+        deps, after = step_deps(steps[name])
+        deps = [dep for dep in deps if dep in tasks]
+        results = await asyncio.gather(*(tasks[dep] for dep in deps), return_exceptions=True)
+        await asyncio.gather(*(tasks[dep] for dep in after if dep in tasks), return_exceptions=True)
+        for dep, result in zip(deps, results):
+            if result is False or isinstance(result, Exception):
+                skipped[name] = dep
+                return False
+        async with semaphore:
+            return await steps[name][0]()
+
+    for name in graph_order(steps):
+        tasks[name] = asyncio.ensure_future(run(name))
+    results = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
+    errors = {name: result for name, result in results.items() if isinstance(result, Exception)}
+    failed = [name for name, result in results.items()
+              if name not in skipped and (result is False or isinstance(result, Exception))]
+    return errors, skipped, failed
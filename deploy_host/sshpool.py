@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import hashlib
+import time
+import paramiko
+from deploy_host.executor import BlockingExecutor
+from deploy_host.metrics import ssh_connect_seconds, ssh_exec_seconds
+
+
+class PooledConnection:
+    def __init__(self, client, password):
+        self.client = client
+        self.password = password
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+    def is_active(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+class SSHPool:
+    """ ssh sessions shared by (ip, port, login), blocking paramiko calls run in bounded executor with timeouts """
+
+    def __init__(self, max_connections=20, idle_timeout=300, connect_timeout=10, executor=None, limit=None):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.executor = executor or BlockingExecutor()
+        # governor.FairLimit of ssh commands of the whole server, shared with fair turns between hosts
+        self.limit = limit
+        self.connections = {}
+        self.connecting = {}
+        self.released = None
+        self.reaper = None
+
+    @staticmethod
+    def host_key(host_data):
+        return host_data.client_ip, int(host_data.client_port), host_data.client_login
+
+    @staticmethod
+    def password_hash(host_data):
+        return hashlib.sha256(host_data.client_password.encode("utf-8")).hexdigest()
+
+    async def run_blocking(self, func, *args, timeout=None, abandon=None):
+        return await self.executor.run(func, *args, timeout=timeout, abandon=abandon)
+
+    def _connect(self, host_data):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(host_data.client_ip,
+                    port=int(host_data.client_port),
+                    timeout=self.connect_timeout,
+                    banner_timeout=self.connect_timeout,
+                    auth_timeout=self.connect_timeout,
+                    username=host_data.client_login,
+                    password=host_data.client_password)
+        return ssh
+
+    @staticmethod
+    def _exec(client, command, stdin_data, timeout):
+        stdin, stdout, stderr = client.exec_command(command, get_pty=True, timeout=timeout)
+        try:
+            if stdin_data:
+                stdin.write(stdin_data)
+                stdin.flush()
+            return stdout.read().decode("utf-8")
+        finally:
+            stdout.channel.close()
+
+    async def acquire(self, host_data):
+        if self.released is None:
+            self.released = asyncio.Condition()
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.ensure_future(self.reap())
+        key = self.host_key(host_data)
+        password = self.password_hash(host_data)
+        while True:
+            connection = self.connections.get(key)
+            if connection is not None:
+                if connection.password == password and connection.is_active():
+                    connection.in_use += 1
+                    connection.last_used = time.monotonic()
+                    return connection
+                if connection.in_use == 0:
+                    await self.close(key)
+                    continue
+            elif key in self.connecting:
+                await asyncio.shield(self.connecting[key])
+                continue
+            elif len(self.connections) + len(self.connecting) < self.max_connections or await self.evict_idle():
+                break
+            async with self.released:
+                await self.released.wait()
+
+        self.connecting[key] = asyncio.get_running_loop().create_future()
+        try:
+            with ssh_connect_seconds.time():
+                # session connected after its caller gave up is closed
+                client = await self.run_blocking(self._connect, host_data, timeout=self.connect_timeout * 2,
+                                                 abandon=lambda client: client.close())
+            connection = PooledConnection(client, password)
+            connection.in_use = 1
+            self.connections[key] = connection
+            return connection
+        finally:
+            self.connecting.pop(key).set_result(None)
+            async with self.released:
+                self.released.notify_all()
+
+    async def release(self, connection):
+        connection.in_use -= 1
+        connection.last_used = time.monotonic()
+        async with self.released:
+            self.released.notify_all()
+
+    async def run(self, host_data, command, stdin_data=None, timeout=8):
+        """ run command on host over pooled session and return its output """
+        admission = self.limit.slot(host_data.client_ip) if self.limit is not None else contextlib.nullcontext()
+        async with admission:
+            return await self.run_command(host_data, command, stdin_data, timeout)
+
+    async def run_command(self, host_data, command, stdin_data, timeout):
+        connection = await self.acquire(host_data)
+        try:
+            with ssh_exec_seconds.time():
+                return await self.run_blocking(self._exec, connection.client, command, stdin_data, timeout,
+                                               timeout=timeout + 2)
+        except (paramiko.SSHException, EOFError, OSError):
+            await self.close(self.host_key(host_data))
+            raise
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # thread still waits for output, closing session wakes it up
+            await asyncio.shield(self.close(self.host_key(host_data)))
+            raise
+        finally:
+            await self.release(connection)
+
+    async def close(self, key):
+        connection = self.connections.pop(key, None)
+        if connection is not None:
+            await self.run_blocking(connection.client.close)
+
+    async def evict_idle(self):
+        """ close least recently used idle session to free place for new one """
+        idle = [(connection.last_used, key) for key, connection in self.connections.items()
+                if connection.in_use == 0]
+        if not idle:
+            return False
+        await self.close(min(idle)[1])
+        return True
+
+    async def reap(self):
+        while self.connections or self.connecting:
+            await asyncio.sleep(min(self.idle_timeout, 30))
+            now = time.monotonic()
+            for key, connection in list(self.connections.items()):
+                if connection.in_use == 0 and (now - connection.last_used > self.idle_timeout
+                                               or not connection.is_active()):
+                    await self.close(key)
+
+    async def close_all(self):
+        for key in list(self.connections):
+            await self.close(key)
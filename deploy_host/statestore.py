@@ -0,0 +1,52 @@
+import asyncio
+import json
+import os
+import re
+import time
+import aiofiles
+
+
+class DeployStateStore:
+    """ hash and result of last run of every step per host, one json file per host """
+
+    def __init__(self, path):
+        self.path = path
+        self.states = {}
+        self.locks = {}
+        os.makedirs(path, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def host_key(host_data):
+        return re.sub(r'[^\w.-]', '_', f'{host_data.hotel_id}_{host_data.client_ip}')
+
+    def lock(self, key):
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+        return self.locks[key]
+
+    async def load(self, host_data):
+        key = self.host_key(host_data)
+        if key not in self.states:
+            async with self.lock(key):
+                if key not in self.states:
+                    try:
+                        async with aiofiles.open(os.path.join(self.path, f'{key}.json')) as file:
+                            self.states[key] = json.loads(await file.read())
+                    except (OSError, ValueError):
+                        self.states[key] = {}
+        return self.states[key]
+
+    async def is_done(self, host_data, step, digest):
+        """ step finished successfully last time with the same desired state """
+        state = (await self.load(host_data)).get(step)
+        return state is not None and state["hash"] == digest and state["result"] == "completed"
+
+    async def record(self, host_data, step, digest, success):
+        states = await self.load(host_data)
+        key = self.host_key(host_data)
+        async with self.lock(key):
+            states[step] = {"hash": digest, "result": "completed" if success else "failed", "time": time.time()}
+            path = os.path.join(self.path, f'{key}.json')
+            async with aiofiles.open(f'{path}.tmp', 'w') as file:
+                await file.write(json.dumps(states, indent=1))
+            os.replace(f'{path}.tmp', path)
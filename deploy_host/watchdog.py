@@ -0,0 +1,63 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from deploy_host.metrics import loop_lag_seconds, loop_stalls
+
+
+class LoopWatchdog:
+    """ event loop task beats every interval; a thread notices a missed beat while the loop is still stalled
+    and keeps the stack of the loop thread, which is logged with the stall when the loop runs again """
+
+    def __init__(self, log, interval=0.1, threshold=0.25):
+        self.log = log
+        self.interval = interval
+        self.threshold = threshold
+        self.beat = time.monotonic()
+        self.stack = None
+        self.loop_thread = None
+        self.task = None
+        self.thread = None
+        self.running = False
+
+    @classmethod
+    def from_config(cls, log, config_settings):
+        return cls(log, interval=config_settings.getfloat("WATCHDOG", "interval", fallback=0.1),
+                   threshold=config_settings.getfloat("WATCHDOG", "threshold", fallback=0.25))
+
+    def start(self):
+        self.running = True
+        self.loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+        self.thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.beat = now
+            lag = now - started - self.interval
+            loop_lag_seconds.observe(max(lag, 0))
+            if lag > self.threshold:
+                loop_stalls.inc()
+                stack, self.stack = self.stack, None
+                self.log.write(f'event loop stalled for {lag:.3f}s', task="loop_lag", duration=round(lag, 3),
+                               stack=stack)
+
+    def watch(self):
+        while self.running:
+            time.sleep(self.interval)
+            if self.stack is None and time.monotonic() - self.beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self.loop_thread)
+                if frame is not None:
+                    self.stack = ''.join(traceback.format_stack(frame))
+
+    def stop(self):
+        self.running = False
+        if self.task is not None:
+            self.task.cancel()
@@ -1,16 +1,20 @@
 import asyncio
 import ipaddress
 import json
-import os
 import uvicorn as uvicorn
-from aiofile import async_open
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.staticfiles import StaticFiles
 from starlette.websockets import WebSocket, WebSocketDisconnect
-from deploy_host.deployhost import ConnectionDeployServer
+from deploy_host.backend import backend_from_config
+from deploy_host.deployhost import ConnectionDeployServer, finish_status
 from deploy_host.deployhost import manager
+from deploy_host.jobqueue import JobQueue, JobStore
+from deploy_host.metrics import registry
+from deploy_host.models import DeployRequest, PasswordRequest
+from deploy_host.watchdog import LoopWatchdog
 import websoket_validate
 import configparser
-from datetime import datetime
 
 
 
@@ -20,23 +24,102 @@ config_settings.read("deploy_settings.ini")
 logpath = config_settings["LOG"]["logpath"]
 server_ip = tuple(map(ipaddress.ip_address, config_settings["SERVER_IP"]["ip"].replace(' ', '').split(',')))
 deploy = ConnectionDeployServer(logpath, server_ip)
+watchdog = LoopWatchdog.from_config(deploy.log, config_settings)
+manager.bus.queue_size = config_settings.getint("WEBSOCKET", "queue_size", fallback=500)
+if deploy.apt_cache.mode == "repo":
+    app.mount("/apt", StaticFiles(directory=deploy.apt_cache.repo_dir, check_dir=False), name="apt")
 
-if os.path.isfile(logpath):
-    pass
-else:
-    with open(logpath, 'a') as file:
-        file.write('Start log\n')
 
+@app.on_event("startup")
+async def start_log():
+    deploy.log.write('Start log')
+    watchdog.start()
+    await deploy.ansible_pool.start()
+    await jobs.start()
 
-async def write_log(text):
-    async with async_open(logpath, 'a+') as afp:
-        await afp.write(f'{datetime.now()}: {text} \n')
 
+@app.on_event("shutdown")
+async def close_ssh_sessions():
+    await jobs.stop()
+    await deploy.ansible_pool.stop()
+    deploy.profile.close()
+    await deploy.ssh_pool.close_all()
+    deploy.inventory.close()
+    watchdog.stop()
+    deploy.executor.shutdown()
+    await deploy.log.stop()
 
-async def packages_deploy(data, websocket):
-    data_keys = data["install_list"].strip().split()
-    for packages in data_keys:
-        await asyncio.create_task(deploy.deploy_packeges(packages, data, websocket))
+
+async def server_deploy(data, websocket):
+    request = await websoket_validate.parse_request(DeployRequest, data, websocket)
+    if request is None or request.password_status != True:
+        return
+    await deploy.create_host_config(request)
+    try:
+        success = await deploy.create_install_tasks(request, websocket)
+    finally:
+        await asyncio.shield(deploy.remove_host_config([request.host_data]))
+    await manager.send_personal_message(
+        json.dumps({"task": "finish", "result": success, "status": finish_status(success)}), websocket)
+
+
+async def fleet_deploy(data, websocket):
+    request = await websoket_validate.parse_fleet(data, websocket)
+    if request is None:
+        return
+    success = True
+    if request.hosts:
+        await deploy.create_fleet_config(request)
+        try:
+            success = await deploy.deploy_fleet(request, websocket)
+        finally:
+            await asyncio.shield(deploy.remove_host_config(request.hosts))
+    await manager.send_personal_message(
+        json.dumps({"task": "finish", "result": success, "status": "Fleet instalation finished",
+                    "hosts": [host_data.client_ip for host_data in request.hosts]}), websocket)
+
+
+job_store = JobStore(config_settings.get("JOBS", "path", fallback="deploy_jobs.sqlite"))
+jobs = JobQueue(job_store, manager.bus, {"deploy_server": server_deploy, "deploy_fleet": fleet_deploy},
+                workers=config_settings.getint("JOBS", "workers", fallback=2),
+                keep_days=config_settings.getint("JOBS", "keep_days", fallback=7),
+                max_attempts=config_settings.getint("JOBS", "max_attempts", fallback=3),
+                cancel_on_disconnect=config_settings.getboolean("JOBS", "cancel_on_disconnect", fallback=False),
+                backend=backend_from_config(job_store, config_settings, deploy.log))
+
+registry.gauge("deploy_job_queue_depth", "Deploy jobs waiting for worker", function=lambda: jobs.backend.depth())
+registry.gauge("deploy_inventory_hosts", "Hosts in inventory registry", function=lambda: len(deploy.inventory.entries))
+registry.gauge("deploy_websocket_connections", "Connected websocket clients",
+               function=lambda: len(manager.active_connection))
+registry.gauge("deploy_websocket_pending", "Messages waiting in client queues",
+               function=lambda: sum(len(subscriber.pending) for subscriber in manager.bus.subscribers.values()))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return registry.render()
+
+
+async def send_alert(status, websocket):
+    await manager.send_personal_message(json.dumps({"task": "Alert", "result": True, "status": status}), websocket)
+
+
+async def handle_message(data, websocket):
+    if data["task"] in ("deploy_server", "deploy_fleet"):
+        await jobs.submit(data["task"], data, websocket)
+    elif data["task"] == "attach":
+        if not await jobs.attach(data["job_id"], websocket, int(data.get("since", 0))):
+            await send_alert(f'unknown job {data["job_id"]}', websocket)
+    elif data["task"] == "cancel":
+        if not await jobs.cancel(data["job_id"]):
+            await send_alert(f'unknown job {data["job_id"]}', websocket)
+    elif data["task"] == "watch":
+        # NOC dashboard: every deploy, or one host with client_ip
+        manager.subscribe(websocket, f'host:{data["client_ip"]}' if data.get("client_ip") else "*")
+    elif data["task"] == "check_password":
+        request = await websoket_validate.parse_request(PasswordRequest, data, websocket)
+        if request is not None:
+            await deploy.check_sudo_pass(request, websocket)
 
 
 @app.websocket("/ws/{client_id}")
@@ -46,34 +129,23 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     try:
         while True:
             print("LOOP")
-            data = await websocket.receive_json()
-            if await websoket_validate.validate_server_ip(data, websocket):
-                if data["task"] == "check_password":
-                    if await websoket_validate.check_data_password(data, websocket) is True:
-                        await deploy.check_sudo_pass(data, websocket)
-                if data["task"] == "deploy_server":
-                    if data["password_status"] == True:
-                        if data["dhcp"]["dhcp_status"] == True:
-                            if await websoket_validate.check_install_data(data, websocket) is True:
-                                if await websoket_validate.check_dhcp_data(data, websocket) is True:
-                                    await deploy.create_host_config(data)
-                                    await asyncio.gather(deploy.create_install_tasks(data, websocket),
-                                                         deploy.git_load(data, websocket))
-                                    await manager.send_personal_message(
-                                        json.dumps({"task": "finish", "result": True, "status": "Instalation finished check wrong point and reboot server"}), websocket)
-                        else:
-                            if await websoket_validate.check_install_data(data, websocket):
-                                await deploy.create_host_config(data)
-                                await asyncio.gather(deploy.create_install_tasks(data, websocket), deploy.git_load(data, websocket))
-                                await manager.send_personal_message(
-                                    json.dumps({"task": "finish", "result": True,
-                                                "status": "Instalation finished check wrong point and reboot server"}),
-                                    websocket)
+            try:
+                await handle_message(await websocket.receive_json(), websocket)
+            except KeyError as error:
+                await send_alert(f'malformed message: no {error} field', websocket)
+            except (TypeError, ValueError) as error:
+                # not json object or field of wrong type, connection stays open for next messages
+                await send_alert(f'malformed message: {error}', websocket)
     except WebSocketDisconnect:
+        deploy.log.write(f'disconnect {client_id}', task="disconnect")
+    finally:
         manager.disconnect(websocket)
-        await asyncio.create_subprocess_shell(f'echo `date` - disconnect {client_id} >> {logpath}')
+        await jobs.disconnected(websocket)
 
 
 
 if __name__ == '__main__':
-    uvicorn.run("main:app", host="127.0.0.1", port=5000)
\ No newline at end of file
+    workers = config_settings.getint("BACKEND", "workers", fallback=1)
+    if workers > 1 and not jobs.backend.shared:
+        raise SystemExit('[BACKEND] workers > 1 needs shared backend: type=sqlite')
+    uvicorn.run("main:app", host="127.0.0.1", port=5000, workers=workers)
\ No newline at end of file
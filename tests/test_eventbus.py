@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from deploy_host.eventbus import EventBus
+
+
+class FakeWebSocket:
+    """ records sent messages, send waits while gate is closed like a slow client """
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, message):
+        await self.gate.wait()
+        self.sent.append(json.loads(message))
+
+
+def status(task, status, result=True, client_ip="10.0.0.5", **fields):
+    return json.dumps(dict({"task": task, "result": result, "status": status, "client_ip": client_ip}, **fields))
+
+
+async def drain():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_progress_of_task_is_coalesced_and_replaced_by_result():
+    async def run():
+        bus = EventBus()
+        websocket = FakeWebSocket()
+        bus.add(websocket)
+        for number in range(3):
+            bus.send(websocket, status("nginx", "processing", position=number))
+        bus.send(websocket, status("curl", "processing"))
+        bus.send(websocket, status("curl", "completed"))
+        await drain()
+        return websocket.sent
+
+    sent = asyncio.run(run())
+    assert [(message["task"], message["status"]) for message in sent] == [("nginx", "processing"),
+                                                                           ("curl", "completed")]
+    assert sent[0]["position"] == 2
+
+
+def test_full_queue_drops_progress_before_results():
+    async def run():
+        bus = EventBus(queue_size=3)
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        bus.add(websocket)
+        bus.send(websocket, status("first", "completed"))
+        await drain()
+        # sender waits in send of first message, the rest stays in queue
+        bus.send(websocket, status("nginx", "processing"))
+        bus.send(websocket, status("curl", "completed"))
+        bus.send(websocket, status("rsync", "completed"))
+        bus.send(websocket, status("mc", "completed"))
+        bus.send(websocket, status("git", "completed"))
+        websocket.gate.set()
+        await drain()
+        return websocket.sent
+
+    sent = asyncio.run(run())
+    assert sent[0]["task"] == "first"
+    assert sent[1] == {"task": "Alert", "result": True, "status": "dropped", "dropped": 2}
+    assert [message["task"] for message in sent[2:]] == ["rsync", "mc", "git"]
+
+
+def test_publish_reaches_subscribed_topics_only():
+    async def run():
+        bus = EventBus()
+        job, host, everything, other = (FakeWebSocket() for _ in range(4))
+        for websocket, topic in ((job, "job:1"), (host, "host:10.0.0.5"), (everything, "*"), (other, "job:2")):
+            bus.add(websocket)
+            bus.subscribe(websocket, topic)
+        bus.publish(status("nginx", "completed"), "job:1")
+        bus.publish(json.dumps({"task": "job", "job_id": "2"}), "job:2")
+        await drain()
+        return job.sent, host.sent, everything.sent, other.sent
+
+    job, host, everything, other = asyncio.run(run())
+    assert [message["task"] for message in job] == ["nginx"]
+    assert [message["task"] for message in host] == ["nginx"]
+    assert len(everything) == 2
+    assert other == [{"task": "job", "job_id": "2"}]
+
+
+def test_send_to_unknown_websocket_and_removed_subscriber():
+    async def run():
+        bus = EventBus()
+        websocket = FakeWebSocket()
+        assert bus.send(websocket, status("nginx", "completed")) is False
+        bus.add(websocket)
+        bus.subscribe(websocket, "*")
+        bus.remove(websocket)
+        bus.publish(status("nginx", "completed"))
+        await drain()
+        return websocket.sent
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,91 @@
+import asyncio
+
+from deploy_host.governor import FairLimit, Governor
+
+
+async def hold(limit, session, order, name, release):
+    async with limit.slot(session):
+        order.append(name)
+        await release.wait()
+
+
+def test_sessions_take_slots_in_turn():
+    async def run():
+        limit = FairLimit("playbook", 1)
+        order = []
+        release = asyncio.Event()
+        # first deploy queues three steps before the second deploy asks for one
+        await limit.acquire("first")
+        tasks = [asyncio.create_task(hold(limit, "first", order, f'first{number}', release)) for number in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(limit, "second", order, "second0", release)))
+        await asyncio.sleep(0)
+        release.set()
+        limit.release()
+        await asyncio.gather(*tasks)
+        return order, limit.running
+
+    order, running = asyncio.run(run())
+    assert order == ["first0", "second0", "first1", "first2"]
+    assert running == 0
+
+
+def test_waiters_get_their_positions():
+    async def run():
+        limit = FairLimit("playbook", 1)
+        positions = {}
+
+        def reporter(name):
+            async def on_position(position):
+                positions.setdefault(name, []).append(position)
+            return on_position
+
+        await limit.acquire("first")
+        waiters = [asyncio.create_task(limit.acquire(name, reporter(name))) for name in ("a", "b")]
+        await asyncio.sleep(0.01)
+        limit.release()
+        await asyncio.sleep(0.01)
+        limit.release()
+        await asyncio.gather(*waiters)
+        limit.release()
+        return positions
+
+    assert asyncio.run(run()) == {"a": [1], "b": [2, 1]}
+
+
+def test_cancelled_waiter_leaves_queue_without_slot():
+    async def run():
+        limit = FairLimit("ssh", 1)
+        await limit.acquire("first")
+        waiter = asyncio.create_task(limit.acquire("second"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queued = dict(limit.queues)
+        limit.release()
+        return queued, limit.running
+
+    queued, running = asyncio.run(run())
+    assert queued == {}
+    assert running == 0
+
+
+def test_slot_granted_before_cancel_is_released():
+    async def run():
+        limit = FairLimit("ssh", 1)
+        await limit.acquire("first")
+        waiter = asyncio.create_task(limit.acquire("second"))
+        await asyncio.sleep(0)
+        # slot goes to waiter, cancel comes before waiter runs
+        limit.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return limit.running
+
+    assert asyncio.run(run()) == 0
+
+
+def test_limits_are_shared_by_worker_processes():
+    governor = Governor(max_playbooks=8, min_playbooks=1, max_ssh=20, workers=3)
+    assert (governor.max_playbooks, governor.min_playbooks, governor.ssh.limit) == (2, 1, 6)
+    assert Governor(max_playbooks=2, workers=4).max_playbooks == 1
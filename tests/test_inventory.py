@@ -0,0 +1,87 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+from deploy_host.inventory import InventoryRegistry
+from deploy_host.models import HostData
+
+
+def host(ip, hotel_id="7", password="secret"):
+    return HostData(client_login="deploy", client_ip=ip, client_port=22, client_password=password,
+                    client_sudo_password=password, hostname="host", hotel_id=hotel_id, uplink_interface="eth0")
+
+
+def line(host_data):
+    return f'{host_data.client_ip} ansible_password={host_data.client_password}'
+
+
+def test_file_lives_while_host_is_used(tmp_path):
+    async def run():
+        registry = InventoryRegistry(line, base=str(tmp_path))
+        entry = await registry.acquire(host("10.0.0.1"))
+        await registry.acquire(host("10.0.0.1"))
+        mode = stat.S_IMODE(os.stat(registry.directory).st_mode)
+        registry.release(host("10.0.0.1"))
+        used = os.path.exists(entry.path)
+        registry.release(host("10.0.0.1"))
+        released = os.path.exists(entry.path)
+        await registry.acquire(host("10.0.0.1", password="changed"))
+        with open(entry.path) as file:
+            content = file.read()
+        registry.close()
+        return mode, used, released, content, os.path.exists(registry.directory)
+
+    mode, used, released, content, directory = asyncio.run(run())
+    assert mode == 0o700
+    assert used and not released
+    assert content == '10.0.0.1 ansible_password=changed\n'
+    assert not directory
+
+
+def test_unused_entries_are_evicted_least_recent_first(tmp_path):
+    async def run():
+        registry = InventoryRegistry(line, base=str(tmp_path), max_entries=2)
+        for ip in ("10.0.0.1", "10.0.0.2"):
+            await registry.acquire(host(ip))
+            registry.release(host(ip))
+        # host in use is kept over the limit
+        await registry.acquire(host("10.0.0.3"))
+        await registry.acquire(host("10.0.0.4"))
+        ips = [key[1] for key in registry.entries]
+        registry.close()
+        return ips
+
+    assert asyncio.run(run()) == ["10.0.0.3", "10.0.0.4"]
+
+
+def test_unused_entries_expire_after_ttl(tmp_path):
+    async def run():
+        registry = InventoryRegistry(line, base=str(tmp_path), ttl=0)
+        await registry.acquire(host("10.0.0.1"))
+        await registry.acquire(host("10.0.0.2"))
+        registry.release(host("10.0.0.1"))
+        ips = [key[1] for key in registry.entries]
+        registry.close()
+        return ips
+
+    assert asyncio.run(run()) == ["10.0.0.2"]
+
+
+def test_hotels_behind_one_address_are_apart(tmp_path):
+    async def run():
+        registry = InventoryRegistry(line, base=str(tmp_path))
+        first = await registry.acquire(host("10.0.0.1", hotel_id="7"))
+        second = await registry.acquire(host("10.0.0.1", hotel_id="8", password="other"))
+        hotels = registry.render_hotel("7"), registry.render_hotel("8")
+        with pytest.raises(ValueError):
+            registry.render([first, second])
+        with pytest.raises(KeyError):
+            registry.get(host("10.0.0.1", hotel_id="9"))
+        registry.close()
+        return first.path != second.path, hotels
+
+    apart, hotels = asyncio.run(run())
+    assert apart
+    assert hotels == ('10.0.0.1 ansible_password=secret\n', '10.0.0.1 ansible_password=other\n')
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from deploy_host.eventbus import EventBus
+from deploy_host.jobqueue import DeployJob, JobQueue, JobStore
+
+HOST = {"client_ip": "10.0.0.5", "client_password": "secret", "client_sudo_password": "secret"}
+
+
+def completed(task):
+    return json.dumps({"task": task, "result": True, "status": "completed", "client_ip": HOST["client_ip"]})
+
+
+async def wait_for(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_completed_steps_takes_successful_results_per_host():
+    events = [completed("apt_cache"),
+              json.dumps({"task": "nginx", "result": False, "status": "broked", "client_ip": "10.0.0.5"}),
+              json.dumps({"task": "curl", "result": True, "status": "processing", "client_ip": "10.0.0.5"}),
+              json.dumps({"task": "crontab", "result": True, "status": "completed", "client_ip": "10.0.0.6"}),
+              json.dumps({"task": "job", "result": True, "status": "completed"}),
+              "not json"]
+    job = DeployJob(None, None, "deploy_server", {})
+    assert job.completed_steps(events) == {"10.0.0.5": ["apt_cache"], "10.0.0.6": ["crontab"]}
+
+
+def test_interrupted_job_resumes_without_completed_steps(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    started = []
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def first_attempt(data, websocket):
+            started.append(data.get("resume"))
+            await websocket.send_text(completed("apt_cache"))
+            await gate.wait()
+
+        queue = JobQueue(JobStore(path), EventBus(), {"deploy_server": first_attempt}, workers=1)
+        await queue.start()
+        job = await queue.submit("deploy_server", {"task": "deploy_server", "host_data": HOST})
+        await wait_for(lambda: job.seq >= 2)
+        # server stops while job runs, job stays running in the store
+        await queue.stop()
+
+        async def second_attempt(data, websocket):
+            started.append(data.get("resume"))
+
+        queue = JobQueue(JobStore(path), EventBus(), {"deploy_server": second_attempt}, workers=1)
+        await queue.start()
+        await wait_for(lambda: len(started) == 2)
+        await wait_for(lambda: not queue.jobs)
+        row = await queue.store.get(job.id)
+        events = [json.loads(message) for message in await queue.store.events(job.id)]
+        await queue.stop()
+        return row, events
+
+    row, events = asyncio.run(run())
+    assert started == [None, {"10.0.0.5": ["apt_cache"]}]
+    job_id, kind, data, status, created, attempts = row
+    assert (status, attempts) == ("done", 2)
+    # passwords are not kept for finished job
+    assert json.loads(data)["host_data"]["client_password"] == "***"
+    assert events[-1]["job_status"] == "done"
+
+
+def test_job_over_max_attempts_fails(tmp_path):
+    async def run():
+        store = JobStore(str(tmp_path / "jobs.sqlite"))
+        runs = []
+
+        async def runner(data, websocket):
+            runs.append(data)
+
+        queue = JobQueue(store, EventBus(), {"deploy_server": runner}, workers=1, max_attempts=1)
+        # job was interrupted once already
+        job = DeployJob(store, queue.bus, "deploy_server", {"task": "deploy_server"}, status="running", attempts=1)
+        await store.add(job)
+        await store.set_status(job)
+        await queue.start()
+        await wait_for(lambda: queue.backend.depth() == 0 and not queue.jobs)
+        row = await store.get(job.id)
+        await queue.stop()
+        return runs, row
+
+    runs, row = asyncio.run(run())
+    assert runs == []
+    assert row[3] == "failed"
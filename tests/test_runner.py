@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+
+from deploy_host.runner import PlaybookResult, read_events, stream_playbook
+
+FAKE_ANSIBLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks",
+                                "fake_ansible")
+
+PLAYBOOK = ('- name: packages\n'
+            '  hosts: all\n'
+            '  tasks:\n'
+            '  - name: install nginx\n'
+            '    apt: {name: nginx}\n'
+            '  - name: check installed packages\n'
+            "    command: dpkg-query -W -f='${Package} ${db:Status-Status}\\n' nginx\n"
+            '- name: nginx_config\n'
+            '  hosts: all\n'
+            '  tasks:\n'
+            '  - name: copy config\n'
+            '    copy: {src: a, dest: b}\n')
+
+
+def event(kind, **fields):
+    return (json.dumps(dict(fields, event=kind)) + '\n').encode()
+
+
+def fake_ansible(**variables):
+    env = dict(os.environ, PATH=FAKE_ANSIBLE_DIR + os.pathsep + os.environ["PATH"],
+               FAKE_ANSIBLE_STARTUP="0", FAKE_ANSIBLE_TASK="0")
+    env.update(variables)
+    return env
+
+
+def run_playbook(tmp_path, **variables):
+    playbook = tmp_path / "playbook.yml"
+    playbook.write_text(PLAYBOOK)
+    output = []
+    events = []
+
+    async def on_event(event):
+        events.append(event["event"])
+
+    result = asyncio.run(stream_playbook([str(playbook), "-i", "inventory", "--limit", "10.0.0.5"],
+                                         fake_ansible(**variables), on_event, on_output=output.append))
+    return result, events, output
+
+
+def test_results_of_successful_run(tmp_path):
+    result, events, output = run_playbook(tmp_path, FAKE_ANSIBLE_NOISE="1")
+    assert result.returncode == 0
+    assert result.succeeded("10.0.0.5")
+    assert events == ["play", "task", "ok", "task", "ok", "play", "task", "ok", "stats"]
+    play = result.first_play()
+    assert result.play_succeeded(play, "10.0.0.5")
+    assert [task.task for task in result.play_results(play, "10.0.0.5")] == ["install nginx",
+                                                                           "check installed packages"]
+    assert result.play_results(play, "10.0.0.5")[-1].stdout_lines == ["nginx installed"]
+    # plain text lines are kept apart from events
+    assert output == list(result.output) == ["install nginx output line 0", "check installed packages output line 0",
+                                             "copy config output line 0"]
+
+
+def test_results_of_failed_task(tmp_path):
+    result, events, output = run_playbook(tmp_path, FAKE_ANSIBLE_FAIL="check installed")
+    assert result.returncode == 2
+    assert not result.succeeded("10.0.0.5")
+    assert result.host_stats("10.0.0.5")["failures"] == 1
+    play = result.first_play()
+    assert not result.play_succeeded(play, "10.0.0.5")
+    failed = result.play_results(play, "10.0.0.5")[-1]
+    assert failed.failed and failed.stdout_lines is None
+    # other hosts have no results
+    assert result.play_results(play, "10.0.0.6") == [None, None]
+
+
+def test_read_events_stops_at_worker_line_and_keeps_tail():
+    async def run():
+        stream = asyncio.StreamReader(limit=128)
+        for number in range(3):
+            stream.feed_data(f'noise {number}\n'.encode())
+        stream.feed_data(b'x' * 200 + b'\n')
+        stream.feed_data(event("play", play="all"))
+        stream.feed_data(event("task", play="all", task="t", task_id="1"))
+        stream.feed_data(event("unreachable", play="all", task="t", task_id="1", host="h"))
+        stream.feed_data(event("worker", status="done", returncode=4))
+        stream.feed_data(event("stats", host="h", failures=0, unreachable=1))
+        stream.feed_eof()
+        result = PlaybookResult(tail=2)
+        worker = await read_events(stream, result)
+        return result, worker, await read_events(stream, result)
+
+    result, worker, end = asyncio.run(run())
+    assert worker == {"event": "worker", "status": "done", "returncode": 4}
+    assert list(result.output) == ["noise 1", "noise 2"]
+    assert result.play_results("all", "h")[0].failed
+    assert end is None
+    assert not result.succeeded("h")
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from deploy_host.scheduler import graph_order, run_graph
+
+
+def step(name, log, result=True, seconds=0.01):
+    async def run():
+        log.append(("start", name))
+        await asyncio.sleep(seconds)
+        log.append(("end", name))
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return run
+
+
+def test_graph_order_puts_dependencies_first():
+    steps = {"c": (None, ("b",)), "b": (None, ("a",)), "a": (None, ()), "d": (None, (), ("c",))}
+    order = graph_order(steps)
+    assert order.index("a") < order.index("b") < order.index("c") < order.index("d")
+
+
+def test_graph_order_ignores_missing_dependency_and_finds_cycle():
+    assert graph_order({"a": (None, ("gone",))}) == ["a"]
+    with pytest.raises(ValueError, match="a -> b -> a"):
+        graph_order({"a": (None, ("b",)), "b": (None, ("a",))})
+
+
+def test_failed_step_skips_its_dependents_only():
+    log = []
+    steps = {"a": (step("a", log, result=False), ()),
+             "b": (step("b", log), ("a",)),
+             "c": (step("c", log), ("b",)),
+             "d": (step("d", log), ())}
+    errors, skipped, failed = asyncio.run(run_graph(steps, 3))
+    assert errors == {}
+    assert skipped == {"b": "a", "c": "b"}
+    assert failed == ["a"]
+    assert ("start", "b") not in log and ("start", "c") not in log
+    assert ("end", "d") in log
+
+
+def test_exception_is_error_and_skips_dependents():
+    log = []
+    error = RuntimeError("boom")
+    steps = {"a": (step("a", log, result=error), ()), "b": (step("b", log), ("a",))}
+    errors, skipped, failed = asyncio.run(run_graph(steps, 3))
+    assert errors == {"a": error}
+    assert skipped == {"b": "a"}
+    assert failed == ["a"]
+
+
+def test_order_only_dependency_runs_after_failure():
+    log = []
+    steps = {"packages": (step("packages", log, result=False), ()),
+             "dhcp": (step("dhcp", log), (), ("packages",))}
+    errors, skipped, failed = asyncio.run(run_graph(steps, 3))
+    assert skipped == {}
+    assert failed == ["packages"]
+    assert log.index(("end", "packages")) < log.index(("start", "dhcp"))
+
+
+def test_limit_bounds_running_steps():
+    running = []
+    peak = []
+
+    async def counted():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return True
+
+    steps = {f'step{number}': (counted, ()) for number in range(6)}
+    errors, skipped, failed = asyncio.run(run_graph(steps, 2))
+    assert (errors, skipped, failed) == ({}, {}, [])
+    assert max(peak) == 2
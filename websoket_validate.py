@@ -1,226 +1,59 @@
 import ipaddress
 import json
-from pydantic import BaseModel, ValidationError, validator
-from main import deploy
+from pydantic import ValidationError
+# main imports this module, deploy is looked up at call time so either module can be imported first
+import main
 from deploy_host.deployhost import manager
+from deploy_host.models import FleetRequest, HostData
 
 
-class CheckPasswordValidator(BaseModel):
-    login: str
-    ip_address: ipaddress.IPv4Address
-    port: int
-    password: str
-    sudo_password: str
+async def send_errors(errors, websocket):
+    await manager.send_personal_message(json.dumps({"task": "Alert", "result": True, "status": errors}), websocket)
 
-    @validator('login')
-    def check_login(cls, v):
-        if v == '' or v is None:
-            raise ValueError("login field cannot be empty")
-        return v
 
-    @validator('password')
-    def check_password(cls, v):
-        if v == '' or v is None:
-            raise ValueError("password field cannot be empty")
-        return v
+def validation_errors(error):
+    # input is left out, it has passwords
+    return json.loads(error.json(include_url=False, include_input=False))
 
-    @validator('sudo_password')
-    def check_sudo_password(cls, v):
-        if v == '' or v is None:
-            raise ValueError("sudo password field cannot be empty")
-        return v
 
-    @validator('ip_address')
-    def check_ip_address(cls, v):
-        if v == '' or v is None:
-            raise ValueError('ip address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('ip field should be IPv4')
-        return v
+async def check_server_ip(host_data, websocket):
+    if ipaddress.ip_address(host_data.client_ip) in main.deploy.server_ip:
+        await send_errors([{"loc": ["ip_server"], "msg": 'Это ip адрес vpn сервера!!!', "type": "value_error"}],
+                          websocket)
+        return False
+    return True
 
-    @validator('port')
-    def check_port(cls, v):
-        if v == '' or v is None:
-            raise ValueError('port field - cannot be empty')
-        if not isinstance(v, int):
-            raise ValueError('port field - should integer')
-        return v
 
-
-async def check_data_password(data, websocket):
+async def parse_request(model, data, websocket):
+    """ message as model, validated once; None when it is invalid, errors are sent to websocket """
     try:
-        CheckPasswordValidator(
-            login=data["host_data"]["client_login"].strip(),
-            ip_address=data["host_data"]["client_ip"].strip(),
-            port=data["host_data"]["client_port"].strip(),
-            password=data["host_data"]["client_password"].strip(),
-            sudo_password=data["host_data"]["client_sudo_password"].strip()
-        )
-        return True
+        request = model.model_validate(data)
     except ValidationError as error:
-        error = json.loads(error.json())
-        await manager.send_personal_message(json.dumps({"task": "Alert", "result": True, "status": error}), websocket)
-
-
-class InstallDataValidator(CheckPasswordValidator):
-    hostname: str
-    hotel_id: str
-    uplink_interface: str
-
-    @validator('hostname')
-    def check_hostname(cls, v):
-        if v == '' or v is None:
-            raise ValueError("hostname field cannot be empty")
-        return v
-
-    @validator('hotel_id')
-    def check_hotel_id(cls, v):
-        if v == '' or v is None:
-            raise ValueError("hostname field cannot be empty")
-        return v
-
-    @validator('uplink_interface')
-    def check_uplink_interface(cls, v):
-        if v == '' or v is None:
-            raise ValueError("choose uplink interface interface")
-        return v
-
-
-async def check_install_data(data, websocket):
-    try:
-        InstallDataValidator(
-            login=data["host_data"]["client_login"].strip(),
-            ip_address=data["host_data"]["client_ip"].strip(),
-            port=data["host_data"]["client_port"].strip(),
-            password=data["host_data"]["client_password"].strip(),
-            sudo_password=data["host_data"]["client_sudo_password"].strip(),
-            hostname=data["host_data"]["hostname"].strip(),
-            hotel_id=data["host_data"]["hotel_id"].strip(),
-            uplink_interface=data["host_data"]["uplink_interface"].strip()
-        )
-        return True
-    except ValidationError as error:
-        error = json.loads(error.json())
-        await manager.send_personal_message(json.dumps({"task": "Alert", "result": True, "status": error}), websocket)
-#
-#
-class DhcpDataValidator(BaseModel):
-    dhcp_network: ipaddress.IPv4Address
-    dhcp_mask: ipaddress.IPv4Address
-    dhcp_range_start: ipaddress.IPv4Address
-    dhcp_range_end: ipaddress.IPv4Address
-    dhcp_dns: ipaddress.IPv4Address
-    domain_name: str
-    dhcp_gateway: ipaddress.IPv4Address
-    dhcp_broadcast: ipaddress.IPv4Address
-    dhcp_eth: str
-
-    @validator('dhcp_network')
-    def check_dhcp_network(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_network address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_network field should be IPv4')
-        return v
-
-    @validator('dhcp_range_start')
-    def check_dhcp_range_start(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_range_start address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_range_start field should be IPv4')
-        return v
-
-    @validator('dhcp_range_end')
-    def check_dhcp_range_end(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_range_end address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_range_end field should be IPv4')
-        return v
-
-    @validator('dhcp_dns')
-    def check_dhcp_dns(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_dns address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_dns field should be IPv4')
-        return v
-
-    @validator('domain_name')
-    def check_domain_name(cls, v):
-        if v == '' or v is None:
-            raise ValueError('domain_name field - cannot be empty')
-        return v
-
-    @validator('dhcp_mask')
-    def check_dhcp_mask(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_mask address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_mask field should be IPv4')
-        return v
-
-    @validator('dhcp_gateway')
-    def check_dhcp_gateway(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_gateway address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_gateway field should be IPv4')
-        return v
-
-    @validator('dhcp_broadcast')
-    def check_dhcp_broadcast(cls, v):
-        if v == '' or v is None:
-            raise ValueError('dhcp_broadcast address field - cannot be empty')
-        if not ipaddress.ip_address(v):
-            raise ValueError('dhcp_broadcast field should be IPv4')
-        return v
-
-    @validator('dhcp_eth')
-    def check_dhcp_eth(cls, v):
-        if v == '' or v is None:
-            raise ValueError('choose dhcp interface')
-        return v
-
-
-async def check_dhcp_data(data, websocket):
-    try:
-        DhcpDataValidator(
-            dhcp_network=data["dhcp"]["dhcp_network"].strip(),
-            dhcp_mask=data["dhcp"]["dhcp_mask"].strip(),
-            dhcp_range_start=data["dhcp"]["dhcp_range_start"].strip(),
-            dhcp_range_end=data["dhcp"]["dhcp_range_end"].strip(),
-            dhcp_dns=data["dhcp"]["dhcp_dns"].strip(),
-            domain_name=data["dhcp"]["domain_name"].strip(),
-            dhcp_gateway=data["dhcp"]["dhcp_gateway"].strip(),
-            dhcp_broadcast=data["dhcp"]["dhcp_broadcast"].strip(),
-            dhcp_eth=data["dhcp"]["dhcp_interface"].strip()
-        )
-        return True
-    except ValidationError as error:
-        error = json.loads(error.json())
-        await manager.send_personal_message(json.dumps({"task": "Alert", "result": True, "status": error}),
-                                            websocket)
-
-
-
-
-
-class ServerIpValidator(BaseModel):
-    ip_server: ipaddress.IPv4Address
-
-    @validator('ip_server')
-    def check_server_ip(cls, v):
-        if v in deploy.server_ip:
-            raise ValueError('Это ip адрес vpn сервера!!!')
-        return v
+        await send_errors(validation_errors(error), websocket)
+        return None
+    if not await check_server_ip(request.host_data, websocket):
+        return None
+    return request
 
 
-async def validate_server_ip(data, websocket):
+async def parse_fleet(data, websocket):
+    """ fleet message with valid hosts only, every invalid host is reported and skipped """
     try:
-        ServerIpValidator(ip_server=data["host_data"]["client_ip"].strip())
-        return True
+        request = FleetRequest.model_validate(dict(data, hosts=()))
     except ValidationError as error:
-        error = json.loads(error.json())
-        await manager.send_personal_message(json.dumps({"task": "Alert", "result": True, "status": error}), websocket)
+        await send_errors(validation_errors(error), websocket)
+        return None
+    if not isinstance(data.get("hosts"), list):
+        await send_errors([{"loc": ["hosts"], "msg": 'hosts field should be a list', "type": "list_type"}],
+                          websocket)
+        return None
+    hosts = []
+    for host_data in data["hosts"]:
+        try:
+            host_data = HostData.model_validate(host_data)
+        except ValidationError as error:
+            await send_errors(validation_errors(error), websocket)
+            continue
+        if await check_server_ip(host_data, websocket):
+            hosts.append(host_data)
+    return request.model_copy(update={"hosts": tuple(hosts)})